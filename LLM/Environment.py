@@ -1,5 +1,5 @@
 import os
-from groq import Groq
+from groq import AsyncGroq, Groq
 from dotenv import load_dotenv
 
 
@@ -10,6 +10,7 @@ class Environment:
         self.location_code = os.getenv("CAMBRIDGE_LOCATION_CODE")
         self.model = "llama-3.3-70b-versatile"
         self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.async_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))  # For use inside an event loop (backend-api)
         self.qdrant_url = os.getenv("QDRANT_URL")
         self.collection_name = os.getenv("QDRANT_COLLECTION_NAME")
         self.qdrant_api_key = os.getenv("QDRANT_API_KEY")
@@ -26,6 +27,9 @@ class Environment:
     def get_client(self):
         return self.client
 
+    def get_async_client(self):
+        return self.async_client
+
     def get_qdrant_url(self):
         return self.qdrant_url
 
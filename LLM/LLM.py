@@ -1,129 +1,177 @@
 import pandas as pd
 import asyncio
 import json
-from datetime import datetime
-from toolsSprint1 import (
-    get_properties_at_cambridge_bay,
-    get_daily_sea_temperature_stats_cambridge_bay,
-    get_deployed_devices_over_time_interval,
-    get_active_instruments_at_cambridge_bay,
-    # get_time_range_of_available_data,
-)
-from toolsSprint2 import (
-    get_daily_air_temperature_stats_cambridge_bay,
-    get_oxygen_data_24h,
-    get_ship_noise_acoustic_for_date,
-    get_wind_speed_at_timestamp,
-    get_ice_thickness,
-)
+import logging
 from RAG import RAG
 from Environment import Environment
-from Constants.toolDescriptions import toolDescriptions
+from Constants.toolDescriptions import toolDescriptions  # Importing this registers the Sprint 1 + 2 tools
+from toolRegistry import registry, ToolArgumentError
+from promptAssembler import PromptAssembler
+from toolRouter import ToolRouter
+from retrievalRouter import RetrievalRouter
+
+logger = logging.getLogger(__name__)
 
 class LLM:
     def __init__(
         self, env: Environment
         , RAG_instance: RAG = None
+        , max_tool_rounds: int = 3  # Rounds of tool calls before the model has to answer
+        , timeout_seconds: float = 60  # Wall-clock limit for a whole run_conversation call
+        , max_request_tokens: int = 30000  # Token budget (all completions of a request) before forcing an answer
     ):
-        self.client = env.get_client()  # Get the Groq client from the environment
+        self.client = env.get_async_client()  # Async Groq client so a request doesn't block the event loop
         #self.model = env.get_model()  # Get the model to use from the environment
         self.model = "llama-3.1-8b-instant" #use this one when model limit is reached
         self.RAG_instance = RAG_instance if RAG_instance else RAG(env)  # Use provided RAG instance or create a new one
-        self.available_functions = {
-            "get_properties_at_cambridge_bay": get_properties_at_cambridge_bay,
-            "get_daily_sea_temperature_stats_cambridge_bay": get_daily_sea_temperature_stats_cambridge_bay,
-            "get_deployed_devices_over_time_interval": get_deployed_devices_over_time_interval,
-            "get_active_instruments_at_cambridge_bay": get_active_instruments_at_cambridge_bay,
-            # "get_time_range_of_available_data": get_time_range_of_available_data
+        # Fixed message order so the tools + system prompt (+ history) prefix can be cached by Groq
+        self.prompt_assembler = PromptAssembler(toolDescriptions)
+        self.tools = registry  # Every @tool function, with argument validation and per-tool timing
+        # Only the few tools most similar to the prompt are sent with each request
+        self.tool_router = ToolRouter(self.RAG_instance.embedding, toolDescriptions, available=self.tools)
+        # Retrieval only runs when the prompt looks like it needs documents, otherwise the model gets it as a tool
+        self.retrieval_router = RetrievalRouter(self.RAG_instance.embedding)
+        self.tools.tool(name="search_documents", replace=True)(self.search_documents)
+        self.search_tool = self.tools.schemas(["search_documents"])
+        self.max_tool_rounds = max_tool_rounds
+        self.timeout_seconds = timeout_seconds
+        self.max_request_tokens = max_request_tokens
+        self.answer_reserve_seconds = min(10, timeout_seconds / 4)  # Time kept for the final answer
+
+    @staticmethod
+    def documents_to_text(vectorDBResponse):
+        if isinstance(vectorDBResponse, pd.DataFrame):
+            if vectorDBResponse.empty:
+                return ""
+            # Convert DataFrame to a more readable format
+            return vectorDBResponse.to_string(index=False)
+        return str(vectorDBResponse)
+
+    async def search_documents(self, query: str):
+        """
+        Search the Ocean Networks Canada document database (instrument and device information, property definitions,
+        observatory background) for passages relevant to the query. Use it for explanations, not for measurements.
+        Args:
+            query (str): What to look up, as a standalone question
+        """
+        # Embedding + search + rerank is blocking CPU work, run it in a worker thread
+        return self.documents_to_text(await asyncio.to_thread(self.RAG_instance.get_documents, query))
+
+    async def call_tool(self, tool_call, timeout):
+        """Runs one tool call, returns the tool message (errors and timeouts are reported to the model)"""
+        function_name = tool_call.function.name
+        print(f"Calling function: {function_name} with args: {tool_call.function.arguments}")
+        try:
+            function_response = await asyncio.wait_for(
+                self.tools.dispatch(function_name, tool_call.function.arguments), timeout=max(timeout, 0)
+            )
+        except ToolArgumentError as e:
+            # Rejected before calling ONC, tell the model what was wrong instead of failing the request
+            function_response = {"error": str(e)}
+        except asyncio.TimeoutError:
+            function_response = {"error": f"{function_name} timed out"}
+        except Exception as e:
+            function_response = {"error": f"{function_name} failed: {e}"}
+        #print(f"Function response: {function_response}")
+        return {
+            "tool_call_id": tool_call.id,
+            "role": "tool",  # Indicates this message is from tool use
+            "name": function_name,
+            "content": json.dumps(function_response, default=str),
         }
 
     async def run_conversation(self, user_prompt, startingPrompt: str = None, chatHistory: list[dict] = []):
         try:
             #print("Starting conversation with user prompt:", user_prompt)
-            CurrentDate = datetime.now().strftime("%Y-%m-%d")
-            if startingPrompt is None:
-                startingPrompt = f"You are a helpful assistant for Oceans Network Canada that can use tools. \
-                    The current day is: {CurrentDate}. You can CHOOSE to use the given tools to obtain the data needed to answer the prompt and provide the results IF that is required. Dont summarize data unles asked to."
-
-            #print(user_prompt)
-            messages = chatHistory + [
-                {
-                    "role": "system",
-                    "content": startingPrompt,
-                },
-                {
-                    "role": "user",
-                    "content": user_prompt,
-                }
-            ]
-
-            print("Calling vectorDB")
-            vectorDBResponse = self.RAG_instance.get_documents(user_prompt)
-            if isinstance(vectorDBResponse, pd.DataFrame):
-                if vectorDBResponse.empty:
-                    vector_content = ""
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout_seconds
+            tools, vector_content = [], ""
+            # Chit-chat ("thanks", "hi") needs neither documents nor tools, skip embedding the prompt at all
+            if not self.retrieval_router.is_chitchat(user_prompt):
+                # The prompt is embedded once, for tool selection, the retrieval decision and the retrieval itself
+                query_embedding = await asyncio.to_thread(self.RAG_instance.embedding.embed_query, user_prompt)
+                tool_scores = self.tool_router.scores(query_embedding)
+                tools = self.tool_router.select(query_embedding, tool_scores)
+                if self.retrieval_router.needs_retrieval(query_embedding, tool_scores):
+                    print("Calling vectorDB")
+                    # Embedding + search + rerank is blocking CPU work, run it in a worker thread
+                    vectorDBResponse = await asyncio.to_thread(self.RAG_instance.get_documents, user_prompt, query_embedding)
+                    vector_content = self.documents_to_text(vectorDBResponse)
                 else:
-                    # Convert DataFrame to a more readable format
-                    vector_content = vectorDBResponse.to_string(index=False)
-            else:
-                vector_content = str(vectorDBResponse)
-            messages.append({
-                "role": "system",
-                "content": vector_content
-                }) 
-            
-            response = self.client.chat.completions.create(
-                model=self.model,  # LLM to use
-                messages=messages,  # Conversation history
-                stream=False,
-                tools=toolDescriptions,  # Available tools (i.e. functions) for our LLM to use
-                tool_choice="auto",  # Let our LLM decide when to use tools
-                max_completion_tokens=4096,  # Maximum number of tokens to allow in our response
-                temperature=0.25,  # A temperature of 1=default balance between randomnes and confidence. Less than 1 is less randomness, Greater than is more randomness
+                    # Looks like a live-data question, the model can still search documents if it needs them
+                    tools = tools + self.search_tool
+
+            # static system prompt -> history -> date + documents -> user prompt (tools are sent first by Groq)
+            messages = self.prompt_assembler.assemble(
+                user_prompt, chatHistory, vector_content, system_prompt=startingPrompt, tools=tools
             )
-            #print("resp:", response)
-            response_message = response.choices[0].message
-            # print(vector_content)
-            tool_calls = response_message.tool_calls
-            # print(tool_calls)
-            if tool_calls:
-                #print("Tool calls detected, processing...")
-                for tool_call in tool_calls:
-                    # print(tool_call)
-                    # print()
-                    function_name = tool_call.function.name
-
-                    if function_name in self.available_functions:
-                        function_args = json.loads(tool_call.function.arguments)
-                        print(f"Calling function: {function_name} with args: {function_args}")
-                        if not function_args:
-                            function_response = await self.available_functions[function_name]()
-                        else:
-                            function_response = await self.available_functions[function_name](**function_args)
-                        #print(f"Function response: {function_response}")
-                        messages.append(
-                            {
-                                "tool_call_id": tool_call.id,
-                                "role": "tool",  # Indicates this message is from tool use
-                                "name": function_name,
-                                "content": json.dumps(function_response),
-                            }
-                        )  # May be able to use this for getting most recent data if needed.
+
+            # Groq rejects an empty tools list, leave the parameters out instead
+            tool_kwargs = {"tools": tools, "tool_choice": "auto"} if tools else {}
+            usage = {"rounds": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+            # Agent loop: the model may call tools (in parallel within a round) up to max_tool_rounds times,
+            # then, or once the deadline / token budget is close, it has to answer without tools
+            for tool_round in range(self.max_tool_rounds + 1):
+                remaining = deadline - loop.time()
+                final_round = (
+                    tool_round == self.max_tool_rounds
+                    or remaining <= self.answer_reserve_seconds
+                    or usage["total_tokens"] >= self.max_request_tokens
+                )
+                response = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=self.model,  # LLM to use
+                        messages=messages,  # Conversation history
+                        stream=False,
+                        max_completion_tokens=4096,  # Maximum number of tokens to allow in our response
+                        temperature=0.25,  # A temperature of 1=default balance between randomnes and confidence. Less than 1 is less randomness, Greater than is more randomness
+                        **({} if final_round else tool_kwargs),  # Selected tools (i.e. functions) for our LLM to use, chosen when needed ("auto")
+                    ),
+                    timeout=max(remaining, 0),
+                )
+                #print("resp:", response)
+                self.prompt_assembler.stats.record_usage(response.usage)
+                usage["rounds"] += 1
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                    usage[key] += getattr(response.usage, key, 0) or 0
+
+                response_message = response.choices[0].message
+                tool_calls = response_message.tool_calls
+                if final_round or not tool_calls:
+                    break  # Early exit, the model answered
+
+                # The assistant turn with the tool calls must precede the tool results (and keeps the prefix shared)
+                messages.append(response_message.model_dump(exclude_none=True))
+                tool_timeout = deadline - loop.time() - self.answer_reserve_seconds
+                messages += await asyncio.gather(*(self.call_tool(tool_call, tool_timeout) for tool_call in tool_calls))
                 #print("Messages after tool calls:", messages)
-                second_response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    max_completion_tokens=4096,
-                    temperature=0.25
-                )  # Calls LLM again with all the data from all functions
-                # Return the final response
-                #print("Second response:", second_response)
-                return second_response.choices[0].message.content
-            else:
-                return response_message.content
-        except:
+
+            logger.info(
+                f"LLM request: {usage['rounds']} completions, "
+                f"{usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion tokens"
+            )
+            return response_message.content
+        except Exception:
+            # Cancellation (worker / server shutdown) is not caught and propagates to the caller
+            logger.exception("LLM request failed")
             return "Sorry, your request failed. Please try again."
-    
+
+    async def summarize(self, previous_summary: str = None, chatHistory: list[dict] = []):
+        """Fold older turns of a conversation into its rolling summary (no RAG or tools, one completion)"""
+        summaryPrompt = "Summarize the conversation between a user and an assistant for Oceans Network Canada. \
+            Keep the questions asked, locations, instruments, dates and numbers that were mentioned. Answer with the summary only, at most 200 words."
+        messages = [{"role": "system", "content": summaryPrompt}]
+        if previous_summary:
+            messages.append({"role": "system", "content": f"Summary so far: {previous_summary}"})
+        messages += chatHistory
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_completion_tokens=512,
+            temperature=0,
+        )
+        return response.choices[0].message.content
 
 
 async def main():
@@ -52,9 +52,10 @@ class RAG:
         self.model = HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-base")
         self.compressor = CrossEncoderReranker(model=self.model, top_n=15)
 
-    def get_documents(self, question: str):
-    
-        query_embedding = self.embedding.embed_query(question)
+    def get_documents(self, question: str, query_embedding=None):
+        # The caller may pass the query embedding if it already computed one (e.g. for tool routing)
+        if query_embedding is None:
+            query_embedding = self.embedding.embed_query(question)
         search_results = self.qdrant_client.search(
             collection_name=self.collection_name,
             query_vector=query_embedding,
@@ -0,0 +1,185 @@
+import asyncio
+import copy
+import json
+from pathlib import Path
+
+from onc import ONC
+from RAG import JinaEmbeddings, QdrantClientWrapper
+from Environment import Environment
+from deviceScraper import DeviceDefinitionScraper
+from vectorDBUpload import (
+    format_devices_for_vdb,
+    get_cvterm_uris,
+    get_onc_client,
+    prepare_embedding_input_from_preformatted,
+    upload_to_vector_db,
+)
+
+'''
+Builds the device-info corpus for a whole ONC location tree and uploads it to the vector DB.
+
+1. Walk the location tree below `root_location_code` (same call as apiTesting.py: getLocationsTree).
+2. Fetch the devices of every sub-location concurrently.
+3. De-duplicate devices shared between locations (keyed by deviceCode, all location codes are kept).
+4. Scrape every cvTerm definition once through a shared DeviceDefinitionScraper.
+5. Chunk, embed (batched) and upload the devices in groups, checkpointing after each group.
+
+The checkpoint file records the device listing and every device already uploaded. After a crash, rerunning
+with the same checkpoint skips the finished work; point ids are derived from the chunk ids so a group that
+was uploaded but not yet checkpointed is overwritten rather than duplicated. The checkpoint is deleted once
+a build finishes, so the next run starts from fresh device listings.
+
+Usage:
+    python corpusBuilder.py CBY
+'''
+
+DEFAULT_CHECKPOINT_PATH = Path(__file__).resolve().parent / ".cache" / "corpus_checkpoint.json"
+
+
+def flatten_location_tree(tree: list) -> list:
+    """Return every locationCode in a getLocationsTree response (depth first, parents before children)"""
+    codes = []
+    stack = list(reversed(tree or []))
+    while stack:
+        node = stack.pop()
+        if node.get("locationCode"):
+            codes.append(node["locationCode"])
+        stack.extend(reversed(node.get("children") or []))
+    return list(dict.fromkeys(codes))
+
+
+class CorpusBuilder:
+    def __init__(
+        self,
+        onc: ONC = None,
+        embedding_model: JinaEmbeddings = None,
+        qdrant: QdrantClientWrapper = None,
+        checkpoint_path: Path = DEFAULT_CHECKPOINT_PATH,
+        max_concurrency: int = 8,
+        devices_per_upload: int = 32,
+        embedding_batch_size: int = 64,
+    ):
+        self.onc = onc if onc else get_onc_client()
+        self.embedding_model = embedding_model
+        self.qdrant = qdrant
+        self.checkpoint_path = Path(checkpoint_path)
+        self.max_concurrency = max_concurrency
+        self.devices_per_upload = devices_per_upload
+        self.embedding_batch_size = embedding_batch_size
+        self.checkpoint = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> dict:
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"root": None, "devices_by_location": {}, "uploaded": []}
+
+    def _clear_checkpoint(self):
+        """Forget a finished build (the file and the in-memory state)"""
+        self.checkpoint_path.unlink(missing_ok=True)
+        self.checkpoint = {"root": None, "devices_by_location": {}, "uploaded": []}
+
+    def _save_checkpoint(self):
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f)
+        tmp_path.replace(self.checkpoint_path)
+
+    async def get_location_codes(self, root_location_code: str) -> list:
+        tree = await asyncio.to_thread(self.onc.getLocationsTree, {"locationCode": root_location_code})
+        # The root itself may or may not be part of the response depending on the API version
+        return list(dict.fromkeys([root_location_code] + flatten_location_tree(tree)))
+
+    async def _get_devices(self, location_code: str, semaphore: asyncio.Semaphore) -> list:
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(self.onc.getDevices, {"locationCode": location_code})
+            except Exception as e:
+                # Locations without devices come back as a 404
+                if getattr(getattr(e, "response", None), "status_code", None) == 404:
+                    return []
+                raise
+
+    async def get_devices_by_location(self, location_codes: list) -> dict:
+        """Fetch devices for all locations concurrently, reusing listings saved in the checkpoint"""
+        done = self.checkpoint["devices_by_location"]
+        missing = [code for code in location_codes if code not in done]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        listings = await asyncio.gather(*(self._get_devices(code, semaphore) for code in missing))
+        for code, devices in zip(missing, listings):
+            done[code] = devices or []
+        self._save_checkpoint()
+        return {code: done[code] for code in location_codes}
+
+    @staticmethod
+    def deduplicate_devices(devices_by_location: dict) -> list:
+        """Merge devices listed under several locations. Returns [(device, [location codes])]"""
+        merged = {}
+        for location_code, devices in devices_by_location.items():
+            for device in devices:
+                code = device["deviceCode"]
+                if code not in merged:
+                    merged[code] = (device, [])
+                merged[code][1].append(location_code)
+        return list(merged.values())
+
+    async def build(self, root_location_code: str) -> dict:
+        """Build and upload the corpus for every location below root_location_code"""
+        if self.checkpoint["root"] not in (None, root_location_code):
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} belongs to {self.checkpoint['root']}, not {root_location_code}"
+            )
+        self.checkpoint["root"] = root_location_code
+
+        location_codes = await self.get_location_codes(root_location_code)
+        devices_by_location = await self.get_devices_by_location(location_codes)
+        devices = self.deduplicate_devices(devices_by_location)
+
+        uploaded = set(self.checkpoint["uploaded"])
+        remaining = [(device, codes) for device, codes in devices if device["deviceCode"] not in uploaded]
+        print(f"{len(location_codes)} locations, {len(devices)} unique devices, {len(remaining)} left to upload")
+
+        if remaining:
+            if self.embedding_model is None:
+                self.embedding_model = JinaEmbeddings()
+            if self.qdrant is None:
+                self.qdrant = QdrantClientWrapper(Environment())
+
+        async with DeviceDefinitionScraper() as scraper:
+            for start in range(0, len(remaining), self.devices_per_upload):
+                group = remaining[start:start + self.devices_per_upload]
+                definitions = await scraper.get_definitions(get_cvterm_uris([device for device, _ in group]))
+
+                sections = []
+                for device, codes in group:
+                    sections.extend(format_devices_for_vdb([copy.deepcopy(device)], ", ".join(codes), definitions))
+
+                # Embedding and upload are blocking, keep them off the event loop
+                results = await asyncio.to_thread(
+                    prepare_embedding_input_from_preformatted,
+                    sections,
+                    self.embedding_model,
+                    self.embedding_batch_size,
+                )
+                await asyncio.to_thread(upload_to_vector_db, results, self.qdrant, True)
+
+                self.checkpoint["uploaded"].extend(device["deviceCode"] for device, _ in group)
+                self._save_checkpoint()
+                scraper.save_cache()
+                print(f"Uploaded {min(start + len(group), len(remaining))}/{len(remaining)} devices")
+
+        # Done: the listings in the checkpoint would otherwise hide new devices from every later run
+        self._clear_checkpoint()
+        return {
+            "locations": len(location_codes),
+            "devices": len(devices),
+            "uploaded": len(remaining),
+        }
+
+
+if __name__ == "__main__":
+    import sys
+
+    root = sys.argv[1] if len(sys.argv) > 1 else "CBY"
+    print(asyncio.run(CorpusBuilder().build(root)))
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+import httpx
+from bs4 import BeautifulSoup
+
+'''
+Async scraper for the vocabulary pages linked from ONC device `cvTerm` entries.
+
+A single pooled httpx client is shared by every request, the number of requests in flight is
+bounded by a semaphore, and each URI is fetched at most once per run. Definitions are persisted
+to a JSON cache together with the ETag / Last-Modified validators so later runs can use
+conditional requests (a 304 costs no parsing and almost no transfer).
+
+Usage:
+    async with DeviceDefinitionScraper() as scraper:
+        definitions = await scraper.get_definitions(uris)  # {uri: definition}
+'''
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "cvterm_definitions.json"
+
+
+class DefinitionFetchError(Exception):
+    """A vocabulary page could not be fetched (error status or network failure)"""
+
+    def __init__(self, uri: str, reason: str):
+        super().__init__(f"Failed to fetch data from {uri}: {reason}")
+        self.uri = uri
+
+
+def parse_definition(html: str) -> str:
+    """Extract the text of the 'Definition' row from a vocabulary page"""
+    soup = BeautifulSoup(html, "html.parser")
+    definition_row = soup.find("th", string="Definition")
+    if definition_row:
+        return definition_row.find_next_sibling("td").text.strip()
+    return ""
+
+
+class DeviceDefinitionScraper:
+    def __init__(
+        self,
+        cache_path: Path = DEFAULT_CACHE_PATH,
+        max_concurrency: int = 16,
+        timeout: float = 10.0,
+        revalidate_after: float = 24 * 60 * 60,
+    ):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # Cached entries younger than this (in seconds) are used without contacting the server
+        self.revalidate_after = revalidate_after
+
+        self._cache = self._load_cache()
+        self._client = None
+        self._semaphore = None
+        self._inflight = {}
+        self._dirty = False
+        self.stats = {"fetched": 0, "not_modified": 0, "cache_hits": 0, "failed": 0}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency
+            )
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._inflight.clear()
+        self.save_cache()
+
+    def _load_cache(self) -> dict:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # A corrupt cache only costs a refetch
+            return {}
+
+    def save_cache(self):
+        """Write the URI -> definition cache to disk (atomically) if it changed"""
+        if self.cache_path is None or not self._dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f)
+        tmp_path.replace(self.cache_path)
+        self._dirty = False
+
+    async def get_definition(self, uri: str) -> str:
+        """Return the definition for a single URI, sharing the request with any concurrent callers"""
+        task = self._inflight.get(uri)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(uri))
+            self._inflight[uri] = task
+        return await task
+
+    async def get_definitions(self, uris) -> dict:
+        """
+        Fetch the definitions of many URIs concurrently. Returns {uri: definition}.
+        A URI that can't be fetched gets its last cached definition, or "" if there is none,
+        so one bad page doesn't abort the whole batch.
+        """
+        unique_uris = list(dict.fromkeys(uris))
+        results = await asyncio.gather(*(self.get_definition(uri) for uri in unique_uris), return_exceptions=True)
+        definitions = {}
+        for uri, result in zip(unique_uris, results):
+            if isinstance(result, DefinitionFetchError):
+                logger.warning(str(result))
+                self.stats["failed"] += 1
+                result = self._cache.get(uri, {}).get("definition", "")
+            elif isinstance(result, BaseException):
+                raise result
+            definitions[uri] = result
+        return definitions
+
+    async def _fetch(self, uri: str) -> str:
+        if self._client is None:
+            await self.open()
+
+        cached = self._cache.get(uri)
+        if cached is not None and time.time() - cached.get("checked_at", 0) < self.revalidate_after:
+            self.stats["cache_hits"] += 1
+            return cached["definition"]
+
+        # Conditional request so unchanged pages come back as an empty 304
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self._semaphore:
+            try:
+                response = await self._client.get(uri, headers=headers)
+            except httpx.HTTPError as e:
+                raise DefinitionFetchError(uri, repr(e)) from e
+
+        if response.status_code == 304 and cached is not None:
+            self.stats["not_modified"] += 1
+            cached["checked_at"] = time.time()
+            self._dirty = True
+            return cached["definition"]
+        if response.status_code != 200:
+            raise DefinitionFetchError(uri, f"HTTP {response.status_code}")
+
+        self.stats["fetched"] += 1
+        definition = parse_definition(response.text)
+        self._cache[uri] = {
+            "definition": definition,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "checked_at": time.time(),
+        }
+        self._dirty = True
+        return definition
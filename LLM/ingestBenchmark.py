@@ -0,0 +1,231 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import fitz  # PyMuPDF
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import VectorParams, Distance
+
+from vectorDBUpload import (
+    NearDuplicateFilter,
+    chunk_sections,
+    embed_chunks,
+    extract_structured_chunks,
+    group_sections,
+    upload_to_vector_db,
+)
+
+'''
+Benchmark for the PDF ingestion path in vectorDBUpload.py.
+
+Generates synthetic PDFs (headings, body paragraphs and repeated boilerplate), then runs
+extract_structured_chunks -> group_sections -> chunk_sections -> de-duplication -> embed_chunks -> upload
+against an in-memory Qdrant instance and reports time per stage, throughput and peak RSS as JSON.
+
+Usage:
+    python ingestBenchmark.py --pdfs 5 --pages 20 --output bench.json
+    python ingestBenchmark.py --embeddings jina --compare bench.json   # compare against an earlier run
+
+By default a hashing embedder stands in for the Jina model so the numbers measure the pipeline rather than
+model download/inference; use --embeddings jina to include the real model.
+'''
+
+WORDS = (
+    "ocean salinity temperature conductivity depth pressure sensor hydrophone ice buoy oxygen deployment "
+    "instrument cambridge bay arctic current profile mooring cable observatory sample calibration data stream"
+).split()
+BOILERPLATE = "Ocean Networks Canada. Data and documentation are provided under the ONC data policy. Cite this document when used."
+
+
+class HashingEmbeddings:
+    """Cheap deterministic stand-in for JinaEmbeddings (same embed_documents interface)"""
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "big")
+            rng = np.random.default_rng(seed)
+            vector = rng.standard_normal(self.dim).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+
+
+class LocalQdrant:
+    """Same attributes as RAG.QdrantClientWrapper, backed by an in-memory Qdrant"""
+
+    def __init__(self, dim, collection_name="benchmark"):
+        self.qdrant_client = QdrantClient(":memory:")
+        self.collection_name = collection_name
+        self.qdrant_client.create_collection(
+            collection_name=collection_name, vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+        )
+
+
+def peak_rss_mb():
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+    except ImportError:
+        import psutil
+
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+
+
+def make_synthetic_pdf(path, pages, seed):
+    """Write a PDF with a heading, body text and a repeated footer on every page"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Section {page_num + 1}: {rng.choice(WORDS).title()} Operations", fontsize=16)
+        y = 100
+        while y < 720:
+            line = " ".join(rng.choice(WORDS) for _ in range(12))
+            if rng.random() < 0.15:
+                line += "."
+            page.insert_text((72, y), line, fontsize=10)
+            y += 14
+        page.insert_text((72, 760), BOILERPLATE, fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(pdf_count=3, pages=10, embeddings="hash", batch_size=64, seed=0):
+    timer = StageTimer()
+    if embeddings == "jina":
+        from RAG import JinaEmbeddings
+
+        embedding_model = JinaEmbeddings()
+        dim = 1024
+    else:
+        embedding_model = HashingEmbeddings()
+        dim = embedding_model.dim
+    qdrant = LocalQdrant(dim)
+
+    counts = {"pdfs": pdf_count, "pages": pdf_count * pages, "lines": 0, "sections": 0, "chunks": 0, "embedded": 0}
+    duplicates_removed = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        with timer.stage("generate_pdfs"):
+            for i in range(pdf_count):
+                path = os.path.join(tmp_dir, f"synthetic_{i}.pdf")
+                make_synthetic_pdf(path, pages, seed + i)
+                paths.append(path)
+
+        for path in paths:
+            with timer.stage("extract_structured_chunks"):
+                structured = extract_structured_chunks(path)
+            with timer.stage("group_sections"):
+                sections = group_sections(structured)
+            # The same functions prepare_embedding_input runs, timed one stage at a time
+            with timer.stage("chunk_text_with_heading"):
+                pending = chunk_sections(sections, path)
+            # One filter per file: each file is uploaded before the next one is read
+            with timer.stage("deduplicate"):
+                duplicate_filter = NearDuplicateFilter()
+                kept = duplicate_filter.filter(pending)
+            with timer.stage("embed"):
+                results = embed_chunks(kept, embedding_model, batch_size, deduplicate=False)
+            with timer.stage("upload"):
+                if results:
+                    upload_to_vector_db(results, qdrant)
+
+            counts["lines"] += len(structured)
+            counts["sections"] += len(sections)
+            counts["chunks"] += len(pending)
+            counts["embedded"] += len(results)
+            duplicates_removed += duplicate_filter.removed
+
+    pipeline_seconds = sum(seconds for name, seconds in timer.seconds.items() if name != "generate_pdfs")
+
+    def rate(count, stage):
+        seconds = timer.seconds.get(stage, 0.0)
+        return round(count / seconds, 2) if seconds > 0 else None
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "embeddings": embeddings,
+        "counts": counts,
+        "duplicates_removed": duplicates_removed,
+        "stage_seconds": {name: round(seconds, 4) for name, seconds in timer.seconds.items()},
+        "total_seconds": round(pipeline_seconds, 4),
+        "throughput": {
+            "pages_per_sec": rate(counts["pages"], "extract_structured_chunks"),
+            "chunks_per_sec": rate(counts["chunks"], "chunk_text_with_heading"),
+            "embeddings_per_sec": rate(counts["embedded"], "embed"),
+            "uploads_per_sec": rate(counts["embedded"], "upload"),
+            "end_to_end_pages_per_sec": round(counts["pages"] / pipeline_seconds, 2) if pipeline_seconds else None,
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def compare(current, previous):
+    """Print the relative change in per-stage time against an earlier report"""
+    print(f"Stage timings vs {previous.get('commit')}:")
+    for name, seconds in current["stage_seconds"].items():
+        before = previous.get("stage_seconds", {}).get(name)
+        if before:
+            print(f"  {name:<28}{before:>10.4f}s -> {seconds:>10.4f}s  ({(seconds - before) / before:+.1%})")
+        else:
+            print(f"  {name:<28}{'-':>11} -> {seconds:>10.4f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vector DB ingestion pipeline")
+    parser.add_argument("--pdfs", type=int, default=3, help="number of synthetic PDFs")
+    parser.add_argument("--pages", type=int, default=10, help="pages per PDF")
+    parser.add_argument("--embeddings", choices=["hash", "jina"], default="hash")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    parser.add_argument("--compare", type=Path, help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.pdfs, args.pages, args.embeddings, args.batch_size, args.seed)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from toolsSprint1 import (
 from RAG import RAG
 from Environment import Environment
 from Constants.toolDescriptions import toolDescriptions
+from toolRegistry import registry
 
 
 class LLM:
@@ -81,13 +82,10 @@ class LLM:
                     #print("Vector DB response:", vectorDBResponse)
                     self.messages.append({"role": "system", "content": vectorDBResponse.to_string()})
                     continue  # Skip to next tool call if vectorDB is called
-                function_to_call = self.available_functions[function_name]
                 function_args = json.loads(tool_call.function.arguments)
                 #print(tool_call.function.arguments)
-                if not function_args:
-                    function_response = await function_to_call()
-                else: 
-                    function_response = await function_to_call(**function_args)
+                # Runs sync tools in a worker thread, async ones on the event loop
+                function_response = await registry.dispatch(function_name, function_args)
                 self.messages.append(
                     {
                         "tool_call_id": tool_call.id,
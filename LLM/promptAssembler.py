@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+'''
+Builds the messages for a chat completion in a fixed order so the start of every request is byte-identical:
+
+    tools (sent as the `tools` parameter) -> static system prompt -> chat history -> dynamic context -> user prompt
+
+Providers that cache prompt prefixes (Groq, OpenAI) can then skip re-processing the tools schema, the system
+prompt and, for a running conversation, the history. Anything that changes per request (today's date,
+RAG documents) goes after the history.
+
+PrefixStats measures how much of each prompt was already sent before as a prefix (by this process), how often the
+tools block itself was (see toolRouter.py: a per-prompt tool selection changes it), and records the cached token
+counts the provider reports, if any.
+'''
+
+STATIC_SYSTEM_PROMPT = (
+    "You are a helpful assistant for Oceans Network Canada that can use tools. "
+    "You can CHOOSE to use the given tools to obtain the data needed to answer the prompt and provide the results "
+    "IF that is required. Dont summarize data unles asked to."
+)
+
+
+def serialize(value):
+    """Canonical JSON (sorted keys, no whitespace) so equal content always gives equal bytes"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class PrefixStats:
+    """
+    Remembers hashes of prompt prefixes (cut at message boundaries) and reports, per request,
+    how many bytes of the prompt start with a prefix that was sent before.
+    """
+
+    def __init__(self, max_prefixes=10_000):
+        self.max_prefixes = max_prefixes
+        self._seen = OrderedDict()
+        self._seen_tools = OrderedDict()
+        self.requests = 0
+        self.tools_reused = 0
+        self.prompt_bytes = 0
+        self.reused_bytes = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, tools, messages):
+        """Returns (reused bytes, total bytes) for this prompt"""
+        digest = hashlib.blake2b(serialize(tools).encode("utf-8"), digest_size=16)
+        total = len(serialize(tools).encode("utf-8"))
+        # Nothing after the tools block can be a cached prefix unless the block was sent before
+        tools_key = digest.hexdigest()
+        if tools_key in self._seen_tools:
+            self.tools_reused += 1
+            self._seen_tools.move_to_end(tools_key)
+        else:
+            self._seen_tools[tools_key] = True
+        reused = 0
+        boundaries = []
+        for message in messages:
+            data = serialize(message).encode("utf-8")
+            digest.update(data)
+            total += len(data)
+            boundaries.append((digest.copy().hexdigest(), total))
+
+        for key, size in boundaries:
+            if key in self._seen:
+                reused = size
+                self._seen.move_to_end(key)
+            else:
+                self._seen[key] = True
+        while len(self._seen) > self.max_prefixes:
+            self._seen.popitem(last=False)
+        while len(self._seen_tools) > self.max_prefixes:
+            self._seen_tools.popitem(last=False)
+
+        self.requests += 1
+        self.prompt_bytes += total
+        self.reused_bytes += reused
+        logger.debug(f"Prompt prefix reuse: {reused}/{total} bytes")
+        return reused, total
+
+    def record_usage(self, usage):
+        """Add the provider's token counts (prompt_tokens_details.cached_tokens when it reports them)"""
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+    def report(self):
+        return {
+            "requests": self.requests,
+            "prompt_bytes": self.prompt_bytes,
+            "reused_prefix_bytes": self.reused_bytes,
+            "prefix_reuse_ratio": round(self.reused_bytes / self.prompt_bytes, 4) if self.prompt_bytes else 0.0,
+            "tools_reuse_ratio": round(self.tools_reused / self.requests, 4) if self.requests else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+        }
+
+
+class PromptAssembler:
+    def __init__(self, tools, system_prompt=STATIC_SYSTEM_PROMPT, stats=None):
+        self.tools = tools
+        self.system_prompt = system_prompt
+        self.stats = stats if stats else PrefixStats()
+
+    def assemble(self, user_prompt, chatHistory=[], context_documents="", system_prompt=None, tools=None):
+        """
+        Messages in cache-friendly order. `system_prompt` overrides the static prompt (keep it constant per caller),
+        `context_documents` is the per-request RAG output, `tools` the schemas sent with this request if not all of them.
+        """
+        dynamic = f"The current day is: {datetime.now().strftime('%Y-%m-%d')}."
+        if context_documents:
+            dynamic += f"\n\nRelevant documents:\n{context_documents}"
+
+        messages = [{"role": "system", "content": system_prompt or self.system_prompt}]
+        messages += chatHistory
+        messages.append({"role": "system", "content": dynamic})
+        messages.append({"role": "user", "content": user_prompt})
+        self.stats.record(self.tools if tools is None else tools, messages)
+        return messages
@@ -0,0 +1,76 @@
+import os
+import re
+
+import numpy as np
+
+from toolRouter import load_or_embed, normalize
+
+'''
+Decides per prompt whether RAG retrieval (embed + vector search + rerank) is worth running:
+
+    1. Chit-chat ("thanks", "hi", "ok great") is caught by a regex, before anything is embedded.
+       Such turns get no documents and no tools.
+    2. Otherwise the prompt embedding (already computed for tool selection) is compared with a few example
+       questions that need the document database, and with the tool descriptions. Retrieval runs only if
+       the prompt is at least as close to the document questions as to its best matching tool.
+
+When retrieval is skipped the model still gets the search_documents tool, so it can fetch documents itself.
+'''
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "retrieval_examples.npz")
+
+# Questions answered from documents (manuals, device / property definitions, observatory background)
+RETRIEVAL_EXAMPLES = [
+    "What does a CTD measure?",
+    "How does a hydrophone work?",
+    "What is the Cambridge Bay observatory?",
+    "Which instruments are installed at the Cambridge Bay observatory?",
+    "What is Ocean Networks Canada?",
+    "Explain what dissolved oxygen means for the ocean.",
+    "What is the definition of this property?",
+    "Tell me about the ice buoy device.",
+]
+
+CHITCHAT = re.compile(
+    r"^(hi|hello|hey|thanks|thank you|thank u|thx|ty|ok|okay|cool|great|nice|awesome|perfect|got it|sounds good|"
+    r"bye|goodbye|good (morning|afternoon|evening|night))\b"
+)
+# A request hidden in a short message ("hi, show me the ice thickness") is not chit-chat
+REQUEST_WORDS = re.compile(
+    r"\b(what|how|why|when|where|which|who|can|could|would|show|get|give|find|tell|list|explain|data|temperature)\b"
+)
+MAX_CHITCHAT_WORDS = 5
+
+
+class RetrievalRouter:
+    def __init__(self, embedding_model, examples=RETRIEVAL_EXAMPLES, margin=0.0, cache_path=DEFAULT_CACHE_PATH):
+        """
+        embedding_model: object with embed_documents (e.g. RAG.JinaEmbeddings). Examples are embedded like the
+            tool descriptions (as passages) so both scores are on the same scale
+        margin: added to the document score, > 0 retrieves more often, < 0 less
+        """
+        self.margin = margin
+        self.embeddings = load_or_embed(
+            embedding_model.embed_documents,
+            list(examples),
+            cache_path,
+            type(embedding_model).__name__,
+        )
+
+    @staticmethod
+    def is_chitchat(user_prompt):
+        """Short greetings / thanks / acknowledgements that need neither documents nor tools"""
+        if "?" in user_prompt:
+            return False
+        text = re.sub(r"[^\w\s]", " ", user_prompt.lower()).strip()
+        if len(text.split()) > MAX_CHITCHAT_WORDS or REQUEST_WORDS.search(text):
+            return False
+        return not text or CHITCHAT.match(text) is not None
+
+    def needs_retrieval(self, query_embedding, tool_scores=None):
+        """
+        query_embedding: the prompt embedding, tool_scores: its similarity to each tool (ToolRouter.scores)
+        """
+        retrieval_score = float(np.max(self.embeddings @ normalize(query_embedding)))
+        tool_score = float(np.max(tool_scores)) if tool_scores is not None and len(tool_scores) else -1.0
+        return retrieval_score + self.margin >= tool_score
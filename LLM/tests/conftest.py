@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The LLM package uses flat imports (run from the LLM directory)
+LLM_DIR = Path(__file__).resolve().parents[1]
+if str(LLM_DIR) not in sys.path:
+    sys.path.insert(0, str(LLM_DIR))
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+# corpusBuilder pulls in the ingestion stack (RAG, PDF parsing, Qdrant)
+for module in ("langchain_community", "fitz", "nltk", "qdrant_client"):
+    pytest.importorskip(module)
+
+import corpusBuilder
+from corpusBuilder import CorpusBuilder
+
+
+def make_device(code):
+    return {"deviceCode": code, "deviceName": f"Device {code}", "cvTerm": {"device": []}}
+
+
+class FakeONC:
+    def __init__(self, devices_by_location):
+        self.devices_by_location = devices_by_location
+
+    def getLocationsTree(self, params):
+        return [{"locationCode": "CBY", "children": [{"locationCode": "CBYIP", "children": []}]}]
+
+    def getDevices(self, params):
+        return list(self.devices_by_location.get(params["locationCode"], []))
+
+
+class FakeScraper:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get_definitions(self, uris):
+        return {}
+
+    def save_cache(self):
+        pass
+
+
+def test_build_twice_picks_up_new_devices(tmp_path, monkeypatch):
+    uploaded = []
+    monkeypatch.setattr(corpusBuilder, "DeviceDefinitionScraper", FakeScraper)
+    monkeypatch.setattr(
+        corpusBuilder,
+        "prepare_embedding_input_from_preformatted",
+        lambda sections, *args, **kwargs: [{"id": section["id"]} for section in sections],
+    )
+    monkeypatch.setattr(corpusBuilder, "upload_to_vector_db", lambda results, *args: uploaded.extend(r["id"] for r in results))
+
+    checkpoint_path = tmp_path / "checkpoint.json"
+    onc = FakeONC({"CBY": [make_device("A")], "CBYIP": [make_device("A"), make_device("B")]})
+    builder = CorpusBuilder(onc=onc, embedding_model=object(), qdrant=object(), checkpoint_path=checkpoint_path)
+
+    result = asyncio.run(builder.build("CBY"))
+    assert result == {"locations": 2, "devices": 2, "uploaded": 2}
+    assert sorted(uploaded) == ["A", "B"]
+    # A finished build leaves no checkpoint behind
+    assert not checkpoint_path.exists()
+
+    # A device deployed since the last run is found by the next one
+    onc.devices_by_location["CBYIP"].append(make_device("C"))
+    uploaded.clear()
+    builder = CorpusBuilder(onc=onc, embedding_model=object(), qdrant=object(), checkpoint_path=checkpoint_path)
+    result = asyncio.run(builder.build("CBY"))
+    assert result["devices"] == 3
+    assert sorted(uploaded) == ["A", "B", "C"]
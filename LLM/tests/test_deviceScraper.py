@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+import pytest
+
+from deviceScraper import DefinitionFetchError, DeviceDefinitionScraper
+
+PAGE = "<table><tr><th>Definition</th><td> A conductivity sensor </td></tr></table>"
+
+
+def handler(request):
+    if request.url.path == "/broken":
+        return httpx.Response(500)
+    if request.url.path == "/offline":
+        raise httpx.ConnectError("connection refused", request=request)
+    return httpx.Response(200, text=PAGE)
+
+
+def make_scraper():
+    scraper = DeviceDefinitionScraper(cache_path=None)
+    # Pre-set client (open() keeps it) so requests go to the mock handler
+    scraper._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    scraper._semaphore = asyncio.Semaphore(scraper.max_concurrency)
+    return scraper
+
+
+def test_failed_uris_dont_abort_the_batch():
+    uris = ["http://vocab.test/ok", "http://vocab.test/broken", "http://vocab.test/offline"]
+
+    async def run():
+        async with make_scraper() as scraper:
+            return await scraper.get_definitions(uris), scraper.stats
+
+    definitions, stats = asyncio.run(run())
+    assert definitions == {uris[0]: "A conductivity sensor", uris[1]: "", uris[2]: ""}
+    assert stats["failed"] == 2
+
+
+def test_single_uri_failure_raises():
+    async def run():
+        async with make_scraper() as scraper:
+            await scraper.get_definition("http://vocab.test/broken")
+
+    with pytest.raises(DefinitionFetchError) as excinfo:
+        asyncio.run(run())
+    assert excinfo.value.uri == "http://vocab.test/broken"
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from promptAssembler import PrefixStats, PromptAssembler, serialize
+
+TOOLS = [{"type": "function", "function": {"name": "get_time", "description": "Current time", "parameters": {}}}]
+HISTORY = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello, how can I help?"}]
+
+
+def prefix_bytes(tools, messages):
+    return len(serialize(tools).encode("utf-8")) + sum(len(serialize(message).encode("utf-8")) for message in messages)
+
+
+def assemble(assembler, *args, **kwargs):
+    """Messages and the bytes of them that were reused as a prefix"""
+    reused_before = assembler.stats.reused_bytes
+    messages = assembler.assemble(*args, **kwargs)
+    return messages, assembler.stats.reused_bytes - reused_before
+
+
+def test_static_parts_come_first():
+    assembler = PromptAssembler(TOOLS, system_prompt="Static prompt")
+
+    messages = assembler.assemble("Question", HISTORY, context_documents="Some document")
+
+    assert messages[0] == {"role": "system", "content": "Static prompt"}
+    assert messages[1:3] == HISTORY
+    assert messages[3]["role"] == "system" and "Some document" in messages[3]["content"]
+    assert messages[4] == {"role": "user", "content": "Question"}
+
+
+def test_prefix_is_byte_stable_across_requests():
+    assembler = PromptAssembler(TOOLS, system_prompt="Static prompt")
+    _, reused = assemble(assembler, "First question", HISTORY, context_documents="Document A")
+    assert reused == 0
+
+    messages, reused = assemble(assembler, "Second question", HISTORY, context_documents="Document B")
+
+    # Tools, system prompt and history are shared, the dynamic context and question are not
+    assert reused == prefix_bytes(TOOLS, messages[:3])
+    assert assembler.stats.requests == 2
+
+
+def test_continued_conversation_reuses_earlier_history():
+    assembler = PromptAssembler(TOOLS)
+    assemble(assembler, "Next question", HISTORY)
+    turn = [{"role": "user", "content": "Next question"}, {"role": "assistant", "content": "Answer"}]
+
+    messages, reused = assemble(assembler, "Follow-up", HISTORY + turn)
+
+    assert reused == prefix_bytes(TOOLS, messages[:3])
+
+
+def test_different_tools_share_no_prefix():
+    assembler = PromptAssembler(TOOLS)
+    assemble(assembler, "Question", HISTORY)
+
+    _, reused = assemble(assembler, "Question", HISTORY, tools=[])
+
+    assert reused == 0
+
+
+def test_tools_block_reuse_is_counted():
+    assembler = PromptAssembler(TOOLS)
+    other_tools = TOOLS + [{"type": "function", "function": {"name": "search_documents"}}]
+    for tools in [TOOLS, other_tools, TOOLS, TOOLS]:
+        assembler.assemble("Question", HISTORY, tools=tools)
+
+    assert assembler.stats.tools_reused == 2
+    assert assembler.stats.report()["tools_reuse_ratio"] == 0.5
+
+
+def test_prefixes_are_evicted_least_recently_used_first():
+    stats = PrefixStats(max_prefixes=2)
+    for content in ["a", "b", "c"]:
+        stats.record([], [{"role": "user", "content": content}])
+
+    assert stats.record([], [{"role": "user", "content": "a"}])[0] == 0
+    assert stats.record([], [{"role": "user", "content": "c"}])[0] > 0
+
+
+def test_record_usage_and_report():
+    stats = PrefixStats()
+    stats.record(TOOLS, [{"role": "user", "content": "Hi"}])
+    stats.record_usage(SimpleNamespace(prompt_tokens=100, prompt_tokens_details=SimpleNamespace(cached_tokens=60)))
+    stats.record_usage(SimpleNamespace(prompt_tokens=50, prompt_tokens_details=None))
+    stats.record_usage(None)
+
+    report = stats.report()
+    assert report["requests"] == 1
+    assert (report["prompt_tokens"], report["cached_tokens"]) == (150, 60)
+    assert report["prefix_reuse_ratio"] == 0.0
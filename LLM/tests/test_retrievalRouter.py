@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from retrievalRouter import RetrievalRouter
+
+
+@pytest.mark.parametrize(
+    "prompt",
+    ["thanks", "Thank you!", "ok great", "hi", "Hello :)", "good morning", "got it, thx", "", "  "],
+)
+def test_chitchat(prompt):
+    assert RetrievalRouter.is_chitchat(prompt)
+
+
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "hi, show me the ice thickness",
+        "thanks, what is a CTD",
+        "ok?",
+        "great, the temperature please",
+        "Hello there, could you list the instruments at Cambridge Bay today please",
+        "CTD",
+        "thanksgiving ocean data",
+    ],
+)
+def test_not_chitchat(prompt):
+    assert not RetrievalRouter.is_chitchat(prompt)
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return np.array([[1.0, 0.0], [0.0, 1.0]][: len(texts)])
+
+
+@pytest.mark.parametrize(
+    "query, tool_scores, margin, expected",
+    [
+        ([1.0, 0.0], None, 0.0, True),
+        ([1.0, 0.0], np.array([0.5, 0.9]), 0.0, True),
+        ([0.6, 0.8], np.array([0.95]), 0.0, False),
+        ([0.6, 0.8], np.array([0.95]), 0.2, True),
+        ([0.6, 0.8], np.array([]), 0.0, True),
+    ],
+)
+def test_needs_retrieval(query, tool_scores, margin, expected):
+    router = RetrievalRouter(FakeEmbeddings(), examples=["doc question", "other doc question"], margin=margin, cache_path=None)
+
+    assert router.needs_retrieval(np.array(query), tool_scores) is expected
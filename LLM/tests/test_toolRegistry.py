@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+
+from toolRegistry import ToolArgumentError, ToolRegistry, parse_docstring
+
+
+def test_parse_docstring():
+    description, params = parse_docstring(
+        """
+        Get the data of a device.
+
+        Args:
+            device_code (str): ONC device code,
+                e.g. BPR-Folger-59
+            day: Day as YYYY-MM-DD
+
+        Returns:
+            The data
+        """
+    )
+
+    assert description == "Get the data of a device.\n\nReturns:\n    The data"
+    assert params == {"device_code": "ONC device code, e.g. BPR-Folger-59", "day": "Day as YYYY-MM-DD"}
+
+
+@pytest.fixture()
+def registry():
+    registry = ToolRegistry()
+    calls = []
+
+    @registry.tool(formats={"day": "date"})
+    def get_data(device_code: str, day: str, limit: int = 10, scale: float = 1.0):
+        """
+        Data of a device on a day.
+
+        Args:
+            device_code: ONC device code
+        """
+        calls.append(threading.current_thread() is threading.main_thread())
+        return f"{device_code} {day} {limit} {scale}"
+
+    @registry.tool(formats={"since": "date-time"})
+    async def get_status(since: str = "2024-01-01T00:00:00Z"):
+        return f"ok since {since}"
+
+    @registry.tool()
+    def broken():
+        raise RuntimeError("ONC is down")
+
+    registry.calls = calls
+    return registry
+
+
+def test_schema_from_signature_and_docstring(registry):
+    schema = registry.schemas(["get_data"])[0]["function"]
+
+    assert schema["description"] == "Data of a device on a day."
+    assert schema["parameters"]["required"] == ["device_code", "day"]
+    assert schema["parameters"]["properties"] == {
+        "device_code": {"type": "string", "description": "ONC device code"},
+        "day": {"type": "string", "format": "date"},
+        "limit": {"type": "integer"},
+        "scale": {"type": "number"},
+    }
+
+
+def test_duplicate_registration_is_refused(registry):
+    with pytest.raises(ValueError):
+        registry.tool(name="get_data")(lambda: None)
+
+
+def test_dispatch_runs_valid_calls(registry):
+    result = asyncio.run(registry.dispatch("get_data", '{"device_code": "CTD1", "day": "2024-05-01", "scale": 2}'))
+    assert result == "CTD1 2024-05-01 10 2"
+    # Synchronous tools run in a worker thread
+    assert registry.calls == [False]
+
+    assert asyncio.run(registry.dispatch("get_status", "")) == "ok since 2024-01-01T00:00:00Z"
+    assert registry.report()["get_data"]["calls"] == 1
+
+
+@pytest.mark.parametrize(
+    "name, arguments",
+    [
+        ("get_data", "{not json"),
+        ("get_data", "[1, 2]"),
+        ("get_data", {"device_code": "CTD1"}),
+        ("get_data", {"device_code": "CTD1", "day": "2024-05-01", "unknown": 1}),
+        ("get_data", {"device_code": 5, "day": "2024-05-01"}),
+        ("get_data", {"device_code": "CTD1", "day": "2024-05-01", "limit": True}),
+        ("get_data", {"device_code": "CTD1", "day": "2024-05-01", "limit": 1.5}),
+        ("get_data", {"device_code": "CTD1", "day": "01/05/2024"}),
+        ("get_status", {"since": "yesterday"}),
+    ],
+)
+def test_dispatch_rejects_invalid_calls(registry, name, arguments):
+    with pytest.raises(ToolArgumentError):
+        asyncio.run(registry.dispatch(name, arguments))
+
+    # Rejected before the tool runs
+    assert registry.calls == []
+    report = registry.report()[name]
+    assert (report["calls"], report["rejected"]) == (0, 1)
+
+
+def test_dispatch_rejects_unknown_tools(registry):
+    with pytest.raises(ToolArgumentError):
+        asyncio.run(registry.dispatch("delete_everything", {}))
+
+
+def test_dispatch_records_failures(registry):
+    with pytest.raises(RuntimeError):
+        asyncio.run(registry.dispatch("broken", None))
+
+    report = registry.report()["broken"]
+    assert (report["calls"], report["errors"], report["rejected"]) == (1, 1, 0)
@@ -0,0 +1,82 @@
+import numpy as np
+
+from toolRouter import ToolRouter, load_or_embed, tool_text
+
+
+def make_tool(name):
+    return {"type": "function", "function": {"name": name, "description": f"Does {name}"}}
+
+
+TOOLS = [make_tool(name) for name in ["temperature", "salinity", "deployments", "properties", "not_implemented"]]
+# One direction per tool, the prompt embedding decides the scores
+VECTORS = {
+    "temperature": [1.0, 0.0, 0.0, 0.0],
+    "salinity": [0.0, 1.0, 0.0, 0.0],
+    "deployments": [0.0, 0.0, 1.0, 0.0],
+    "properties": [0.0, 0.0, 0.0, 1.0],
+    "not_implemented": [1.0, 1.0, 1.0, 1.0],
+}
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return np.array([VECTORS[text.split(":")[0].replace(" ", "_")] for text in texts])
+
+
+def names(tools):
+    return [tool["function"]["name"] for tool in tools]
+
+
+def make_router(**kwargs):
+    available = {"temperature", "salinity", "deployments", "properties"}
+    return ToolRouter(FakeEmbeddings(), TOOLS, available=available, cache_path=None, **kwargs)
+
+
+def test_select_keeps_top_k_in_original_order():
+    router = make_router(top_k=2)
+
+    # properties scores highest, but the tools keep their toolDescriptions order
+    assert names(router.select(np.array([0.5, 0.1, 0.0, 0.9]))) == ["temperature", "properties"]
+    assert names(router.select(np.array([0.9, 0.1, 0.0, 0.5]))) == ["temperature", "properties"]
+
+
+def test_select_skips_unavailable_and_low_scoring_tools():
+    router = make_router(top_k=3, min_score=0.3)
+
+    assert "not_implemented" not in names(router.tools)
+    assert names(router.select(np.array([0.2, 0.9, 0.4, 0.0]))) == ["salinity", "deployments"]
+
+
+def test_select_with_top_k_covering_every_tool_is_fixed():
+    router = make_router(top_k=10)
+
+    first = router.select(np.array([1.0, 0.0, 0.0, 0.0]))
+    second = router.select(np.array([0.0, 0.0, 0.2, 1.0]))
+
+    assert names(first) == names(second) == ["temperature", "salinity", "deployments", "properties"]
+
+
+def test_no_tools():
+    router = ToolRouter(FakeEmbeddings(), TOOLS, available=set(), cache_path=None)
+
+    assert router.select(np.array([1.0, 0.0, 0.0, 0.0])) == []
+
+
+def test_embeddings_are_cached_per_model_and_texts(tmp_path):
+    cache_path = str(tmp_path / "tools.npz")
+    embeddings = FakeEmbeddings()
+    texts = [tool_text(tool) for tool in TOOLS[:2]]
+
+    first = load_or_embed(embeddings.embed_documents, texts, cache_path, "FakeEmbeddings")
+    second = load_or_embed(embeddings.embed_documents, texts, cache_path, "FakeEmbeddings")
+    assert embeddings.calls == 1
+    np.testing.assert_array_equal(first, second)
+
+    # Other tool texts or another model invalidate the cache
+    load_or_embed(embeddings.embed_documents, texts[:1], cache_path, "FakeEmbeddings")
+    load_or_embed(embeddings.embed_documents, texts[:1], cache_path, "OtherModel")
+    assert embeddings.calls == 3
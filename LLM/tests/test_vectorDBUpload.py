@@ -0,0 +1,143 @@
+import re
+
+import numpy as np
+import pytest
+
+# vectorDBUpload pulls in the ingestion stack (RAG, PDF parsing, Qdrant)
+for module in ("langchain_community", "fitz", "nltk", "qdrant_client"):
+    pytest.importorskip(module)
+
+import vectorDBUpload
+from vectorDBUpload import (
+    NearDuplicateFilter,
+    SentenceChunker,
+    format_devices_for_vdb,
+    prepare_embedding_input_from_preformatted,
+)
+
+CTD_URI = "http://vocab.nerc.ac.uk/collection/L22/current/TOOL0870/"
+CTD_DEFINITION = (
+    "The SBE 37-SMP MicroCAT is a high accuracy conductivity and temperature recorder with an optional pressure sensor, "
+    "designed for moorings and other long duration fixed site deployments. It has a serial interface and internal "
+    "batteries, and memory for storing samples between downloads. Conductivity is measured with a flow-through cell and "
+    "temperature with an aged and pressure-protected thermistor. A pump draws water through the cell at a constant rate, "
+    "which keeps the time response consistent and reduces fouling. Data are output in engineering units."
+)
+
+
+def split_sentences(text):
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+", text.strip()) if sentence]
+
+
+@pytest.fixture(autouse=True)
+def sentence_tokenizer(monkeypatch):
+    """Split on punctuation instead of nltk's punkt model, which may not be downloaded"""
+    monkeypatch.setattr(vectorDBUpload, "load_sentence_tokenizer", lambda: split_sentences)
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+def make_device(serial):
+    """An ONC device listing, devices of the same model only differ in code, id, name and serial"""
+    return {
+        "cvTerm": {"device": [{"uri": CTD_URI, "vocabulary": "SeaVoX Device Catalogue"}]},
+        "dataRating": [{"dateFrom": "2008-11-01T00:00:00.000Z", "dateTo": None, "samplePeriod": 1.0, "sampleSize": 1}],
+        "deviceCategoryCode": "CTD",
+        "deviceCategoryID": 8,
+        "deviceCode": f"SBECTD37SMP{serial}",
+        "deviceId": int(serial),
+        "deviceLink": f"https://data.oceannetworks.ca/DeviceListing?DeviceId={serial}",
+        "deviceName": f"Sea-Bird SBE 37-SMP MicroCAT C-T Sensor {serial}",
+        "hasDeviceData": True,
+        "serialNumber": serial,
+    }
+
+
+def test_devices_of_the_same_model_are_all_kept():
+    devices = [make_device(serial) for serial in ("7012", "7013", "7014", "7015", "7016")]
+    codes = [device["deviceCode"] for device in devices]
+    sections = format_devices_for_vdb(devices, "CBYIP", {CTD_URI: CTD_DEFINITION})
+
+    results = prepare_embedding_input_from_preformatted(sections, FakeEmbeddings())
+
+    assert sorted(result["id"] for result in results) == sorted(f"{code}_chunk_0" for code in codes)
+    assert all("also_in" not in result["metadata"] for result in results)
+
+
+def test_repeated_records_are_embedded_once():
+    section = {"heading": "Device", "paragraphs": ["Some text."], "page": [], "id": "DEV1", "source": "ONC"}
+
+    results = prepare_embedding_input_from_preformatted([section, dict(section)], FakeEmbeddings())
+
+    assert [result["id"] for result in results] == ["DEV1_chunk_0"]
+
+
+def make_sentences(lengths):
+    return [" ".join(f"w{i}_{j}" for j in range(length - 1)) + f" end{i}." for i, length in enumerate(lengths)]
+
+
+def test_chunks_stay_within_max_tokens_and_overlap():
+    sentences = make_sentences([7, 3, 12, 5, 9, 4, 4, 11, 6, 2, 8])
+    chunks = SentenceChunker(max_tokens=20, overlap=6).chunk(" ".join(sentences))
+
+    chunk_sentences = [split_sentences(chunk) for chunk in chunks]
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= 20 for chunk in chunks)
+    overlaps = []
+    for previous, current in zip(chunk_sentences, chunk_sentences[1:]):
+        shared = [sentence for sentence in current if sentence in previous]
+        # Overlap is made of whole trailing sentences of the previous chunk
+        assert shared == previous[len(previous) - len(shared):]
+        overlaps.append(sum(len(sentence.split()) for sentence in shared))
+    assert 0 < max(overlaps) <= 6
+    # Every sentence is kept, in order
+    assert list(dict.fromkeys(sentence for chunk in chunk_sentences for sentence in chunk)) == sentences
+
+
+def test_sentence_longer_than_max_tokens_is_its_own_chunk():
+    sentences = make_sentences([3, 30, 3])
+    chunks = SentenceChunker(max_tokens=10, overlap=2).chunk(" ".join(sentences), heading="Heading")
+
+    assert chunks == [f"Heading\n{sentence}" for sentence in sentences]
+
+
+def test_overlap_must_be_smaller_than_max_tokens():
+    with pytest.raises(ValueError):
+        SentenceChunker(max_tokens=10, overlap=10)
+
+
+def make_chunk(chunk_id, text):
+    return {"id": chunk_id, "text": text, "metadata": {"source": "test.pdf"}}
+
+
+def test_near_duplicate_threshold():
+    duplicate_filter = NearDuplicateFilter(max_distance=6)
+    # 6 differing bits leave one of the 7 bands equal (a candidate within the threshold), 7 can differ in every band
+    signatures = {"base": 0, "six": sum(1 << bit for bit in range(0, 60, 10)), "seven": sum(1 << bit for bit in range(0, 63, 9))}
+    duplicate_filter.simhash = lambda text: signatures[text]
+
+    kept = duplicate_filter.filter([make_chunk("a", "base"), make_chunk("b", "six"), make_chunk("c", "seven")])
+
+    assert [item["id"] for item in kept] == ["a", "c"]
+    assert kept[0]["metadata"]["also_in"] == ["b"]
+    assert (duplicate_filter.seen, duplicate_filter.removed) == (3, 1)
+
+
+def test_near_duplicate_text():
+    boilerplate = (
+        "Ocean Networks Canada operates cabled observatories that supply continuous power and internet connectivity "
+        "to scientific instruments on the seafloor, in the water column and at the surface."
+    )
+    duplicate_filter = NearDuplicateFilter()
+
+    kept = duplicate_filter.filter([
+        make_chunk("page_1", boilerplate),
+        make_chunk("page_2", f"{boilerplate} Page 2"),
+        make_chunk("other", "The hydrophone records underwater sound at the Cambridge Bay observatory every winter."),
+    ])
+
+    assert [item["id"] for item in kept] == ["page_1", "other"]
+    assert kept[0]["metadata"]["also_in"] == ["page_2"]
@@ -0,0 +1,222 @@
+import asyncio
+import inspect
+import json
+import logging
+import re
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+'''
+Single place where LLM tools are registered. Decorating a function with @tool:
+
+    - builds its JSON schema once, at import time, from the signature (parameter names, types, defaults)
+      and the docstring (description, plus "Args:" lines for the parameter descriptions)
+    - makes it callable by name through registry.dispatch, which validates the arguments the model sent
+      before anything hits the ONC API, and runs synchronous tools in a worker thread
+    - records calls, failures, rejected calls and time spent per tool (registry.report())
+
+Parameters can be given a format ("date" = YYYY-MM-DD, "date-time" = ISO 8601) that is checked on dispatch:
+
+    @tool(formats={"day_str": "date"})
+    async def get_something(day_str: str): ...
+'''
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+SECTION_HEADER = re.compile(r"^(Args|Arguments|Returns|Raises|Example|Examples|Note):\s*$")
+ARG_LINE = re.compile(r"^(\w+)\s*(?:\([^)]*\))?\s*:\s*(.*)$")
+
+
+class ToolArgumentError(ValueError):
+    """The model called a tool with arguments that don't match its schema"""
+
+
+def is_date(value):
+    datetime.strptime(value, "%Y-%m-%d")
+
+
+def is_datetime(value):
+    datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+FORMAT_CHECKS = {"date": is_date, "date-time": is_datetime}
+
+
+def parse_docstring(doc):
+    """Splits a docstring into (description, {parameter: description}), the Args section being removed"""
+    description, params = [], {}
+    in_args, last = False, None
+    for line in inspect.cleandoc(doc or "").splitlines():
+        stripped = line.strip()
+        header = SECTION_HEADER.match(stripped)
+        if header:
+            in_args = header.group(1) in ("Args", "Arguments")
+            last = None
+            if in_args:
+                continue
+        if in_args:
+            match = ARG_LINE.match(stripped)
+            if match:
+                last = match.group(1)
+                params[last] = match.group(2)
+            elif stripped and last:
+                params[last] += " " + stripped
+            continue
+        description.append(line)
+    return "\n".join(description).strip(), params
+
+
+def build_schema(func, name, formats):
+    description, arg_docs = parse_docstring(func.__doc__)
+    properties, required = {}, []
+    for param in inspect.signature(func).parameters.values():
+        annotation = param.annotation if param.annotation is not inspect.Parameter.empty else str
+        prop = {"type": JSON_TYPES.get(annotation, "string")}
+        if param.name in arg_docs:
+            prop["description"] = arg_docs[param.name]
+        if param.name in formats:
+            prop["format"] = formats[param.name]
+        if param.default is inspect.Parameter.empty:
+            required.append(param.name)
+        properties[param.name] = prop
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+
+class ToolStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds, failed=False):
+        self.calls += 1
+        self.errors += int(failed)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def report(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg_seconds": round(self.total_seconds / self.calls, 4) if self.calls else 0.0,
+            "max_seconds": round(self.max_seconds, 4),
+        }
+
+
+class Tool:
+    def __init__(self, func, name, formats):
+        self.func = func
+        self.name = name
+        self.formats = formats
+        self.schema = build_schema(func, name, formats)
+        self.stats = ToolStats()
+
+    def validate(self, arguments):
+        """Raises ToolArgumentError on unknown / missing parameters, wrong types or badly formatted values"""
+        parameters = self.schema["function"]["parameters"]
+        properties = parameters["properties"]
+        unknown = set(arguments) - set(properties)
+        if unknown:
+            raise ToolArgumentError(f"{self.name}: unexpected arguments {sorted(unknown)}")
+        missing = [param for param in parameters["required"] if param not in arguments]
+        if missing:
+            raise ToolArgumentError(f"{self.name}: missing required arguments {missing}")
+        for param, value in arguments.items():
+            expected = properties[param]["type"]
+            python_types = tuple(t for t, json_type in JSON_TYPES.items() if json_type == expected)
+            if expected == "number":
+                python_types += (int,)
+            # bool is an int subclass, don't accept true/false for numbers
+            if not isinstance(value, python_types) or (isinstance(value, bool) and expected != "boolean"):
+                raise ToolArgumentError(f"{self.name}: {param} should be of type {expected}, got {value!r}")
+            check = FORMAT_CHECKS.get(self.formats.get(param))
+            if check:
+                try:
+                    check(value)
+                except ValueError:
+                    raise ToolArgumentError(f"{self.name}: {param} should be a {self.formats[param]}, got {value!r}")
+
+
+class ToolRegistry:
+    def __init__(self):
+        self.tools = {}
+
+    def tool(self, name=None, formats=None, replace=False):
+        """
+        Decorator that registers a function as an LLM tool (the function is returned unchanged).
+        `replace` allows re-registering a name, e.g. a bound method of a newly created instance.
+        """
+
+        def register(func):
+            tool_name = name or func.__name__
+            if tool_name in self.tools and not replace:
+                raise ValueError(f"Tool {tool_name} is already registered")
+            self.tools[tool_name] = Tool(func, tool_name, formats or {})
+            return func
+
+        return register
+
+    def __contains__(self, name):
+        return name in self.tools
+
+    def schemas(self, names=None):
+        """JSON schemas of the registered tools (all, or the given names) in registration order"""
+        return [tool.schema for tool in self.tools.values() if names is None or tool.name in names]
+
+    async def dispatch(self, name, arguments):
+        """
+        Validates and runs a tool call. `arguments` is the JSON string (or dict) sent by the model.
+        Raises ToolArgumentError for unknown tools / bad arguments without calling the tool.
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            raise ToolArgumentError(f"Unknown tool {name}")
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments) if arguments.strip() else {}
+            except json.JSONDecodeError:
+                tool.stats.rejected += 1
+                raise ToolArgumentError(f"{name}: arguments are not valid JSON")
+        if arguments is None:
+            arguments = {}
+        try:
+            if not isinstance(arguments, dict):
+                raise ToolArgumentError(f"{name}: arguments should be an object")
+            tool.validate(arguments)
+        except ToolArgumentError:
+            tool.stats.rejected += 1
+            raise
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            if inspect.iscoroutinefunction(tool.func):
+                result = await tool.func(**arguments)
+            else:
+                # The ONC client is synchronous, keep it off the event loop
+                result = await asyncio.to_thread(tool.func, **arguments)
+            failed = False
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            tool.stats.record(seconds, failed)
+            logger.debug(f"Tool {name} took {seconds:.3f}s{' (failed)' if failed else ''}")
+
+    def report(self):
+        return {name: tool.stats.report() for name, tool in self.tools.items()}
+
+
+# Process-wide registry, tools modules register with @tool
+registry = ToolRegistry()
+tool = registry.tool
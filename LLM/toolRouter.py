@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+'''
+Picks the tool schemas to send with a request by embedding similarity between the prompt and each tool's
+description, so a request carries a few relevant tools instead of the whole toolDescriptions list.
+
+Tool embeddings are computed once per set of descriptions and cached on disk (LLM/.cache), keyed by a hash
+of the tool texts, so restarts don't re-embed them. Only tools that are actually implemented are considered.
+
+Tradeoff with prompt caching (promptAssembler.py): the tools block is the start of every request, so the cached
+prefix (tools + system prompt + history) is only reused when a prompt gets exactly the same tool selection as an
+earlier one, search_documents included. Keeping the toolDescriptions order helps only in that case. Fewer tools
+means fewer prompt tokens on every request, a fixed block means cache hits on the rest of the prefix;
+PrefixStats.report() ("tools_reuse_ratio", "prefix_reuse_ratio") shows which way a deployment leans. With top_k at
+least the number of tools, select sends all of them in a fixed order (search_documents still depends on the
+retrieval decision).
+'''
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tool_embeddings.npz")
+
+
+def tool_text(tool):
+    """Text embedded for a tool: its name (underscores as spaces) and description"""
+    function = tool["function"]
+    return f"{function['name'].replace('_', ' ')}: {function.get('description', '')}"
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def load_or_embed(embed, texts, cache_path, model_name=""):
+    """
+    Normalized embeddings of `texts` (embed: list of texts -> vectors), read from `cache_path` when it was
+    written for the same model and texts, otherwise computed and saved there.
+    """
+    key = hashlib.sha256(json.dumps([model_name, texts]).encode("utf-8")).hexdigest()
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            cached = np.load(cache_path)
+            if str(cached["key"]) == key:
+                return cached["embeddings"]
+        except (OSError, ValueError, KeyError):
+            pass  # Corrupt or old format, re-embed
+
+    embeddings = normalize(embed(texts))
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write to a temp file first so a crash can't leave a half-written cache
+        tmp_path = f"{cache_path}.tmp.npz"
+        np.savez(tmp_path, key=key, embeddings=embeddings)
+        os.replace(tmp_path, cache_path)
+    return embeddings
+
+
+class ToolRouter:
+    def __init__(self, embedding_model, tools, available=None, top_k=3, min_score=None, cache_path=DEFAULT_CACHE_PATH):
+        """
+        embedding_model: object with embed_documents (e.g. RAG.JinaEmbeddings)
+        tools: tool schemas (Constants.toolDescriptions)
+        available: names of implemented tools, schemas for anything else are never sent
+        top_k: tools sent per request, min_score: optionally drop tools below this cosine similarity
+        """
+        self.tools = [tool for tool in tools if available is None or tool["function"]["name"] in available]
+        self.top_k = top_k
+        self.min_score = min_score
+        self.cache_path = cache_path
+        self.embeddings = (
+            load_or_embed(
+                embedding_model.embed_documents,
+                [tool_text(tool) for tool in self.tools],
+                cache_path,
+                type(embedding_model).__name__,
+            )
+            if self.tools
+            else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    def scores(self, query_embedding):
+        """Cosine similarity of the prompt to every tool (in self.tools order)"""
+        if not self.tools:
+            return np.zeros(0, dtype=np.float32)
+        return self.embeddings @ normalize(query_embedding)
+
+    def select(self, query_embedding, scores=None):
+        """
+        Tool schemas for a prompt, given its embedding (the same one used for RAG retrieval) or precomputed scores.
+        Returned in their original order, so requests on similar topics keep an identical tools prefix.
+        """
+        if not self.tools:
+            return []
+        if scores is None:
+            scores = self.scores(query_embedding)
+        ranked = np.argsort(-scores)[: self.top_k]
+        if self.min_score is not None:
+            ranked = [i for i in ranked if scores[i] >= self.min_score]
+        return [self.tools[i] for i in sorted(ranked)]
@@ -16,6 +16,7 @@ from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import CrossEncoderReranker
 from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 from pathlib import Path
+from toolRegistry import tool
 
 # Load API key and location code from .env
 env_path = Path(__file__).resolve().parent / ".env"
@@ -26,6 +27,7 @@ onc = ONC(ONC_TOKEN)
 cambridgeBayLocations = ["CBY", "CBYDS", "CBYIP", "CBYIJ", "CBYIU", "CBYSP", "CBYSS", "CBYSU", "CF240"]
 
 
+@tool()
 async def get_properties_at_cambridge_bay():
     """Get a list of properties of data available at Cambridge Bay
     Returns a list of dictionaries turned into a string.
@@ -50,6 +52,7 @@ async def get_properties_at_cambridge_bay():
         return json.dumps(list_of_dicts)
 
 
+@tool(formats={"day_str": "date"})
 async def get_daily_sea_temperature_stats_cambridge_bay(day_str: str):
     """
     Get daily sea temperature statistics for Cambridge Bay
@@ -83,7 +86,9 @@ async def get_daily_sea_temperature_stats_cambridge_bay(day_str: str):
     )
 
 
-async def get_deployed_devices_over_time_interval(dateFrom: str, dateTo: str):
+# Tools that only use the synchronous ONC client are plain functions (the tool registry runs them in a worker thread)
+@tool(formats={"dateFrom": "date-time", "dateTo": "date-time"})
+def get_deployed_devices_over_time_interval(dateFrom: str, dateTo: str):
     """
     Get the devices at cambridge bay deployed over the specified time interval including sublocations
     Returns:
@@ -131,10 +136,11 @@ async def get_deployed_devices_over_time_interval(dateFrom: str, dateTo: str):
 
     return json.dumps(deployedDevices)
 
-async def get_active_instruments_at_cambridge_bay():
+@tool()
+def get_active_instruments_at_cambridge_bay():
     """
-    Get the number of instruments collecting data at Cambridge Bay over the specified interval.
-    Uses the ONC Python client to access deployment and stream data.
+    Get the number of currently deployed instruments at Cambridge Bay collecting data.
+    Skips any failed queries silently. This function does not take any parameters.
 
     Returns:
         JSON string: Dictionary with count and optional metadata.
@@ -1,10 +1,12 @@
 import pandas as pd
+import statistics
 from onc import ONC
 from datetime import datetime, timedelta
 
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from toolRegistry import tool
 
 # Load API key and location code from .env
 env_path = Path(__file__).resolve().parent / ".env"
@@ -16,9 +18,12 @@ cambridgeBayLocations = ["CBY", "CBYDS", "CBYIP", "CBYIJ", "CBYIU", "CBYSP", "CB
 # Create ONC object
 onc = ONC(ONC_TOKEN)
 
+# The ONC client is synchronous, so these tools are plain functions (the tool registry runs them in a worker thread)
+
 
 # What was the air temperature in Cambridge Bay on this day last year?
-async def get_daily_air_temperature_stats_cambridge_bay(day_str: str) -> str:
+@tool(formats={"day_str": "date"})
+def get_daily_air_temperature_stats_cambridge_bay(day_str: str) -> dict:
     """
     Get daily air temperature statistics for Cambridge Bay.
     Args:
@@ -75,13 +80,14 @@ async def get_daily_air_temperature_stats_cambridge_bay(day_str: str) -> str:
 
 
 # Can you give me an example of 24 hours of oxygen data?
-async def get_oxygen_data_24h(day_str: str) -> pd.DataFrame:
+@tool(formats={"day_str": "date"})
+def get_oxygen_data_24h(day_str: str) -> str:
     """
-    Get 24 hours of dissolved oxygen data for Cambridge Bay.
+    Get 24 hours of dissolved oxygen data (in mL/L) for Cambridge Bay.
     Args:
         day_str (str): Date in YYYY-MM-DD format
     Returns:
-        pandas DataFrame with datetime + oxygen_ml_per_l columns,
+        pandas DataFrame string with datetime + oxygen_ml_per_l columns,
         sampled at 10 minute intervals.
     """
     # Build 24-hour window
@@ -122,7 +128,8 @@ async def get_oxygen_data_24h(day_str: str) -> pd.DataFrame:
 
 
 # I’m interested in data on ship noise for July 31, 2024 / Get me the acoustic data for the last day in July of 2024
-async def get_ship_noise_acoustic_for_date(day_str: str):
+@tool(formats={"day_str": "date"})
+def get_ship_noise_acoustic_for_date(day_str: str):
     """
     Get 24 hours of ship noise data for Cambridge Bay on a specific date.
     Args:
@@ -138,13 +145,13 @@ async def get_ship_noise_acoustic_for_date(day_str: str):
 
     # Fetch relevant data through API request
     params = {
-        "locationCode": {CAMBRIDGE_LOCATION_CODE},
+        "locationCode": CAMBRIDGE_LOCATION_CODE,
         "deviceCategoryCode": "HYDROPHONE",
         "propertyCode": "voltage",
-        "dateFrom": {date_from_str},
-        "dateTo": {date_to_str},
+        "dateFrom": date_from_str,
+        "dateTo": date_to_str,
         "rowLimit": 250,
-        "token": {ONC_TOKEN}
+        "token": ONC_TOKEN
     }
     data = onc.getScalardata(params)
 
@@ -156,7 +163,8 @@ async def get_ship_noise_acoustic_for_date(day_str: str):
 
 
 # How windy was it at noon on March 1 in Cambridge Bay?
-async def get_wind_speed_at_timestamp(timestamp_str: str) -> float:
+@tool(formats={"timestamp_str": "date-time"})
+def get_wind_speed_at_timestamp(timestamp_str: str) -> float:
     """
     Get wind speed at Cambridge Bay (in m/s) at the specified timestamp.
     Args:
@@ -206,13 +214,15 @@ async def get_wind_speed_at_timestamp(timestamp_str: str) -> float:
 
 
 # How thick was the ice in February this year?
-async def get_ice_thickness(start_date: str, end_date: str) -> float:
+@tool(formats={"start_date": "date", "end_date": "date"})
+def get_ice_thickness(start_date: str, end_date: str) -> float:
     """
-    Get sea-ice thickness for a range of time in Cambridge Bay.
+    Get the average daily sea-ice thickness (in meters) between start_date and end_date (inclusive) for Cambridge Bay.
     Args:
-        day_str (str): Date in YYYY-MM-DD format
+        start_date (str): Start date in YYYY-MM-DD format
+        end_date (str): End date in YYYY-MM-DD format
     Returns:
-        JSON string of the scalar data response
+        float: mean ice thickness across all days in the range, or NaN if no data is found
     """
     # Include the full end_date by adding one day (API dateTo is exclusive)
     end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
@@ -223,10 +233,10 @@ async def get_ice_thickness(start_date: str, end_date: str) -> float:
         "locationCode": "CBYSP",
         "deviceCategoryCode": "ICE_BUOY",
         "propertyCode": "icethickness",
-        "dateFrom": {start_date},
-        "dateTo": {end_date_str},
+        "dateFrom": start_date,
+        "dateTo": end_date_str,
         "rowLimit": 200,
-        "token": {ONC_TOKEN}
+        "token": ONC_TOKEN
     }
 
     # Fetch all records in the range
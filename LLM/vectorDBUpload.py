@@ -1,17 +1,21 @@
 import os
+import re
+import asyncio
+import hashlib
 import fitz  # PyMuPDF
 import nltk
 from nltk.tokenize import sent_tokenize
 from collections import Counter
+from functools import lru_cache
 from RAG import JinaEmbeddings
 from RAG import QdrantClientWrapper
-from uuid import uuid4
+from uuid import NAMESPACE_URL, uuid4, uuid5
 from qdrant_client.models import PointStruct
 from onc import ONC
 from dotenv import load_dotenv
 from pathlib import Path
 import requests
-from bs4 import BeautifulSoup
+from deviceScraper import DefinitionFetchError, DeviceDefinitionScraper, parse_definition
 
 '''
 Series of functions to preprocess PDF files, extract structured text chunks,
@@ -26,9 +30,17 @@ Usage for pdfs:
     - `metadata`: Additional metadata source file, section heading, page number, and chunk index.
 3. Call `upload_to_vector_db(resultsList, qdrant)` to upload the list of results to a Qdrant vector database.
 
+For PDFs, near-duplicate chunks (boilerplate repeated across pages and documents) are dropped before embedding. Pass the same
+`NearDuplicateFilter` as `duplicate_filter` to several calls to de-duplicate across files (upload their results
+only after the last call, kept chunks list the ids of their dropped duplicates under metadata["also_in"]), or `deduplicate=False` to keep everything.
+Preformatted records (ONC devices) are not near-deduplicated by default: devices of the same model differ only in
+code, serial and name, and each has to stay retrievable. Only chunks with the same id and text are collapsed.
+
 Usage for scraping ONC URIs:
 1. Call `get_uris_from_onc(location_code)` with the desired location code to retrieve a list of URIs.
 2. Call `getformatFromURI(uri)` for each URI to extract structured information, including heading, paragraphs, page numbers, identifier, and source URL.
+   For device pages, `get_device_info_from_onc_for_vdb(location_code)` does this in one step. The cvTerm definitions are
+   scraped concurrently and cached on disk (see deviceScraper.py); from async code use `get_device_info_from_onc_for_vdb_async`.
 3. Use `prepare_embedding_input_from_preformatted(input, embedding_model)` to prepare the embedding input from the list of structured data obtained from the URIs.
 4. Call `upload_to_vector_db(resultsList, qdrant)` to upload the list of results to a Qdrant vector database.
 
@@ -98,52 +110,175 @@ def group_sections(chunks):
 
 
 
-#Default to small max tokens for better search and matching and faster
-def chunk_text_with_heading(text, heading="", max_tokens=300, overlap=50):
+@lru_cache(maxsize=None)
+def load_sentence_tokenizer():
+    # Only look up / download the punkt model once per process
     try:
         nltk.data.find('tokenizers/punkt_tab')
     except LookupError:
         nltk.download('punkt_tab')
-    sentences = sent_tokenize(text)
-    chunks = []
-    current = []
-    current_len = 0
-
-    for sentence in sentences:
-        tokens = len(sentence.split())  # word-based token approximation
-        # If adding this sentence would exceed the token limit
-        if current_len + tokens > max_tokens:
-            chunk_body = " ".join(current)
-            chunk_text = f"{heading}\n{chunk_body}".strip()
-            chunks.append(chunk_text)
-            # Create overlap
-            current = current[-overlap:] if overlap > 0 else []
-            current_len = sum(len(s.split()) for s in current)
-
-        current.append(sentence)
-        current_len += tokens
-    # Final chunk
-    if current:
-        chunk_body = " ".join(current)
-        chunk_text = f"{heading}\n{chunk_body}".strip()
-        chunks.append(chunk_text)
-    return chunks
-
-def prepare_embedding_input(file_path: str, embedding_model: JinaEmbeddings = None):
-    structured_chunks = extract_structured_chunks(file_path)
-    sections = group_sections(structured_chunks)
+    return sent_tokenize
+
+
+class SentenceChunker:
+    """
+    Splits text into chunks of whole sentences of at most `max_tokens` words (word-based token approximation).
+    Consecutive chunks share up to `overlap` words of trailing sentences. Sentence lengths are computed once
+    and the window only moves forward, so chunking is a single linear pass over the text.
+    """
+
+    def __init__(self, max_tokens=300, overlap=50):
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = max(overlap, 0)
+        self.tokenize = load_sentence_tokenizer()
+
+    def _format(self, heading, sentences):
+        chunk_body = " ".join(sentences)
+        return f"{heading}\n{chunk_body}".strip()
+
+    def chunk(self, text, heading=""):
+        sentences = self.tokenize(text)
+        lengths = [len(sentence.split()) for sentence in sentences]
+        chunks = []
+        start = 0  # first sentence of the current chunk
+        current_len = 0
+
+        for i, tokens in enumerate(lengths):
+            # If adding this sentence would exceed the token limit
+            if current_len + tokens > self.max_tokens and i > start:
+                chunks.append(self._format(heading, sentences[start:i]))
+
+                # Carry over trailing sentences that fit in the overlap budget (and still leave room for this one)
+                new_start = i
+                overlap_len = 0
+                while (
+                    new_start > start
+                    and overlap_len + lengths[new_start - 1] <= self.overlap
+                    and overlap_len + lengths[new_start - 1] + tokens <= self.max_tokens
+                ):
+                    new_start -= 1
+                    overlap_len += lengths[new_start]
+                start = new_start
+                current_len = overlap_len
+
+            current_len += tokens
+        # Final chunk
+        if start < len(sentences):
+            chunks.append(self._format(heading, sentences[start:]))
+        return chunks
+
+
+#Default to small max tokens for better search and matching and faster
+def chunk_text_with_heading(text, heading="", max_tokens=300, overlap=50):
+    return SentenceChunker(max_tokens, overlap).chunk(text, heading)
+
+class NearDuplicateFilter:
+    """
+    Drops chunks whose text is a near-duplicate of a chunk that was already kept (repeated citation text,
+    cvTerm blobs, page headers, ...). Each chunk gets a 64-bit SimHash over its word shingles; two chunks are
+    near-duplicates when their hashes differ in at most `max_distance` bits. The hash is split into
+    `max_distance + 1` bands so candidate pairs share at least one band exactly and only those are compared.
+
+    The kept chunk records the ids of the chunks it stands in for under metadata["also_in"], so only dedupe
+    against chunks that are not stored yet. A single filter can be reused across calls until they are uploaded.
+    """
+
+    HASH_BITS = 64
+
+    def __init__(self, max_distance=6, shingle_size=3):
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.band_count = max_distance + 1
+        self.band_bits = self.HASH_BITS // self.band_count
+        self._bands = [dict() for _ in range(self.band_count)]
+        self.seen = 0
+        self.removed = 0
+
+    def simhash(self, text):
+        words = re.findall(r"\w+", text.lower())
+        n = self.shingle_size
+        shingles = [" ".join(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))]
+        weights = [0] * self.HASH_BITS
+        for shingle in shingles:
+            h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for bit in range(self.HASH_BITS):
+                weights[bit] += 1 if (h >> bit) & 1 else -1
+        return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+    def _band_keys(self, signature):
+        mask = (1 << self.band_bits) - 1
+        return [(signature >> (band * self.band_bits)) & mask for band in range(self.band_count)]
+
+    def find_duplicate(self, signature):
+        for band, key in zip(self._bands, self._band_keys(signature)):
+            for candidate_signature, item in band.get(key, []):
+                if bin(signature ^ candidate_signature).count("1") <= self.max_distance:
+                    return item
+        return None
+
+    def filter(self, items):
+        kept = []
+        for item in items:
+            self.seen += 1
+            signature = self.simhash(item["text"])
+            duplicate_of = self.find_duplicate(signature)
+            if duplicate_of is not None:
+                self.removed += 1
+                # Ids rather than sources: every ONC device chunk has the same source
+                also_in = duplicate_of["metadata"].setdefault("also_in", [])
+                if item["id"] != duplicate_of["id"] and item["id"] not in also_in:
+                    also_in.append(item["id"])
+                continue
+            for band, key in zip(self._bands, self._band_keys(signature)):
+                band.setdefault(key, []).append((signature, item))
+            kept.append(item)
+        return kept
+
+    def report(self):
+        percent = 100 * self.removed / self.seen if self.seen else 0.0
+        return f"Removed {self.removed} of {self.seen} chunks as near-duplicates ({percent:.1f}%)"
+
+
+# Embeds chunks of the form {'id': ..., 'text': ..., 'metadata': {...}} in batches of `batch_size`,
+# dropping near-duplicates first unless deduplicate=False
+def embed_chunks(pending: list, embedding_model: JinaEmbeddings = None, batch_size: int = 64,
+                 deduplicate: bool = True, duplicate_filter: NearDuplicateFilter = None):
+    if deduplicate:
+        if duplicate_filter is None:
+            duplicate_filter = NearDuplicateFilter()
+        pending = duplicate_filter.filter(pending)
+        print(duplicate_filter.report())
+
+    if pending and embedding_model is None:
+        embedding_model = JinaEmbeddings()
+
     results = []
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        embeddings = embedding_model.embed_documents([item["text"] for item in batch])
+        for item, embedding in zip(batch, embeddings):
+            results.append({
+                "id": item["id"],
+                "embedding": embedding.tolist(),
+                "text": item["text"],
+                "metadata": item["metadata"]
+            })
+
+    return results
 
-    for section in sections:
+# Chunks the sections of one PDF into the {'id', 'text', 'metadata'} records embed_chunks takes
+def chunk_sections(sections: list, file_path: str):
+    pending = []
+
+    for section_index, section in enumerate(sections):
         full_text = " ".join(section["paragraphs"])
         chunks = chunk_text_with_heading(full_text, section["heading"])
-        if embedding_model is None:
-            embedding_model = JinaEmbeddings()
-        embeddings = embedding_model.embed_documents(chunks)
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            results.append({
-                "id": f"{os.path.basename(file_path)}_chunk_{i}",
-                "embedding": embedding.tolist(),
+        for i, chunk in enumerate(chunks):
+            pending.append({
+                # Chunk indices restart in every section, the section index keeps ids unique within the file
+                "id": f"{os.path.basename(file_path)}_section_{section_index}_chunk_{i}",
                 "text": chunk,
                 "metadata": {
                     "source": os.path.basename(file_path),
@@ -152,26 +287,35 @@ def prepare_embedding_input(file_path: str, embedding_model: JinaEmbeddings = No
                     "chunk_index": i
                 }
             })
+    return pending
 
-    return results
+def prepare_embedding_input(file_path: str, embedding_model: JinaEmbeddings = None, batch_size: int = 64,
+                            deduplicate: bool = True, duplicate_filter: NearDuplicateFilter = None):
+    structured_chunks = extract_structured_chunks(file_path)
+    sections = group_sections(structured_chunks)
+    pending = chunk_sections(sections, file_path)
 
-# input must be of form [{'heading': '...', 'paragraphs': ['...', '...'], 'page': [1, 2, ...], 'id': '...', 'source': '...'}, ...]
-def prepare_embedding_input_from_preformatted(input: list, embedding_model: JinaEmbeddings = None):
+    return embed_chunks(pending, embedding_model, batch_size, deduplicate, duplicate_filter)
 
-    results = []
+# input must be of form [{'heading': '...', 'paragraphs': ['...', '...'], 'page': [1, 2, ...], 'id': '...', 'source': '...'}, ...]
+# Chunks from all sections are embedded together in batches of `batch_size` rather than one model call per section.
+# Every record is kept (see the module docstring), only a chunk repeated with the same id and text is embedded once
+def prepare_embedding_input_from_preformatted(input: list, embedding_model: JinaEmbeddings = None, batch_size: int = 64,
+                                              deduplicate: bool = False, duplicate_filter: NearDuplicateFilter = None):
 
+    pending = []
+    seen = set()
     for section in input:
         full_text = " ".join(section["paragraphs"])
         chunks = chunk_text_with_heading(full_text, section["heading"])
 
-        if embedding_model is None:
-            embedding_model = JinaEmbeddings()
-        embeddings = embedding_model.embed_documents(chunks)
-
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            results.append({
-                "id": f"{section['id']}_chunk_{i}",
-                "embedding": embedding.tolist(),
+        for i, chunk in enumerate(chunks):
+            chunk_id = f"{section['id']}_chunk_{i}"
+            if (chunk_id, chunk) in seen:
+                continue
+            seen.add((chunk_id, chunk))
+            pending.append({
+                "id": chunk_id,
                 "text": chunk,
                 "metadata": {
                     "source": section["source"],
@@ -181,56 +325,69 @@ def prepare_embedding_input_from_preformatted(input: list, embedding_model: Jina
                 }
             })
 
-    return results
+    return embed_chunks(pending, embedding_model, batch_size, deduplicate, duplicate_filter)
 
 
 def getDeviceDefnFromURI(url):
     response = requests.get(url)
     if response.status_code != 200:
-        raise Exception(f"Failed to fetch data from {url}")
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    definition_row = soup.find('th', string="Definition")
-    if definition_row:
-        definition_text = definition_row.find_next_sibling("td").text.strip()
-    else:
-        definition_text = ""
+        raise DefinitionFetchError(url, f"HTTP {response.status_code}")
 
-    return definition_text
+    return parse_definition(response.text)
 
-def get_device_info_from_onc_for_vdb(location_code):
+def get_onc_client():
     env_path = Path(__file__).resolve().parent / ".env"
     load_dotenv(dotenv_path=env_path)
     ONC_TOKEN = os.getenv("ONC_TOKEN")
-    onc = ONC(ONC_TOKEN)
-
+    return ONC(ONC_TOKEN)
 
-    params = {
-        "locationCode": location_code,
-    }
-    devices = onc.getDevices(params)
+def format_devices_for_vdb(devices: list, location_code: str, definitions: dict):
     results = []
     for i in devices:
         i["LocationCode"] = location_code
-        del i["deviceLink"]
+        i.pop("deviceLink", None)
         for j in i["cvTerm"]["device"]:
-            if "uri" in j:                
-                j["description"] = getDeviceDefnFromURI(j["uri"])
+            if "uri" in j:
+                j["description"] = definitions[j["uri"]]
                 del j["uri"]
         results.append({'heading': i['deviceName'], 'paragraphs': [str(i)], 'page': [], 'id': i["deviceCode"], 'source': "ONC OCEANS 3.0 API"})
-    
     return results
 
+def get_cvterm_uris(devices: list):
+    return [j["uri"] for i in devices for j in i["cvTerm"]["device"] if "uri" in j]
+
+async def get_device_info_from_onc_for_vdb_async(location_code, scraper: DeviceDefinitionScraper = None, onc: ONC = None):
+    if onc is None:
+        onc = get_onc_client()
+
+    params = {
+        "locationCode": location_code,
+    }
+    # The ONC client is synchronous, keep it off the event loop
+    devices = await asyncio.to_thread(onc.getDevices, params)
+
+    # Every cvTerm URI is fetched once, concurrently, through one pooled client
+    if scraper is None:
+        async with DeviceDefinitionScraper() as scraper:
+            definitions = await scraper.get_definitions(get_cvterm_uris(devices))
+    else:
+        definitions = await scraper.get_definitions(get_cvterm_uris(devices))
+
+    return format_devices_for_vdb(devices, location_code, definitions)
+
+def get_device_info_from_onc_for_vdb(location_code):
+    return asyncio.run(get_device_info_from_onc_for_vdb_async(location_code))
+
 
 
 
-def upload_to_vector_db(resultsList: list, qdrant: QdrantClientWrapper):
+# deterministic_ids derives the point id from the chunk id so re-uploading a chunk overwrites it instead of duplicating it
+def upload_to_vector_db(resultsList: list, qdrant: QdrantClientWrapper, deterministic_ids: bool = False):
     points = []
     for item in resultsList:
         points.append(
             PointStruct(
-                id=uuid4().hex,
+                id=uuid5(NAMESPACE_URL, item["id"]).hex if deterministic_ids else uuid4().hex,
                 vector=item["embedding"],
                 payload={
                     "text": item["text"],
@@ -1,26 +1,61 @@
-from typing import Annotated, List
+from typing import Annotated, Callable, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 
 # Dependencies
-from src.database import get_db_session
-from src.auth.dependencies import get_admin_user
+from src.database import get_db_session, get_session_factory
+from src.auth.dependencies import get_admin_user, get_user_cache
+from src.auth.cache import UserCache
+from src.auth import service as auth_service
 
-from src.auth.schemas import UserOut
-from src.llm import models, schemas
+from src.auth.schemas import TokenUser, UserOut
+from src.llm.schemas import MessagePage
+from .schemas import ExportFormat, MessageFilters, UpdateUserRole
+from . import service
 
 router = APIRouter()
 
 
-@router.get("/messages")
+@router.get("/messages", response_model=MessagePage)
 async def get_all_messages(
-    _: Annotated[UserOut, Depends(get_admin_user)], db: Annotated[AsyncSession, Depends(get_db_session)]
-) -> List[schemas.Message]:
-    """Get all messages"""
-    # TODO: add pagination to this in case there are tons of messages
-
-    result = await db.execute(select(models.Message).order_by(models.Message.message_id.desc()))
-    return result.scalars().all()  # type: ignore
+    _: Annotated[TokenUser, Depends(get_admin_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    filters: Annotated[MessageFilters, Depends()],
+    limit: Annotated[int, Query(ge=1, le=500)] = 100,
+    before_message_id: Optional[int] = None,
+) -> MessagePage:
+    """Get a page of all messages in descending order (filter by user, date range, rating)"""
+    return await service.get_messages(db, filters, limit, before_message_id)
+
+
+@router.get("/messages/export")
+async def export_messages(
+    _: Annotated[TokenUser, Depends(get_admin_user)],
+    session_factory: Annotated[Callable, Depends(get_session_factory)],
+    filters: Annotated[MessageFilters, Depends()],
+    format: ExportFormat = "ndjson",
+) -> StreamingResponse:
+    """Download all messages matching the filters as NDJSON or CSV"""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        service.export_messages(session_factory, filters, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="messages.{format}"'},
+    )
+
+
+@router.patch("/users/{user_id}", response_model=UserOut)
+async def update_user_role(
+    request: Request,
+    user_id: int,
+    role: UpdateUserRole,
+    _: Annotated[TokenUser, Depends(get_admin_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    cache: Annotated[Optional[UserCache], Depends(get_user_cache)],
+) -> UserOut:
+    """Grant or revoke admin rights (applies once the user's access token expires, refresh tokens are refused)"""
+    redis = getattr(request.app.state, "redis_client", None)
+    return await auth_service.set_admin(user_id, role.is_admin, db, cache, redis)
@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Annotated, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class MessageFilters(BaseModel):
+    """Query parameters narrowing down the admin message views"""
+    user_id: Optional[int] = None
+    start: Optional[datetime] = None  # created at or after
+    end: Optional[datetime] = None  # created before
+    min_rating: Optional[Annotated[int, Field(ge=1, le=5)]] = None
+    max_rating: Optional[Annotated[int, Field(ge=1, le=5)]] = None
+
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+class UpdateUserRole(BaseModel):
+    """Payload for granting / revoking admin rights"""
+    is_admin: bool
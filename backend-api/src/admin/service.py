@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from contextlib import AbstractAsyncContextManager
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import paginate
+from src.llm.models import Feedback as FeedbackModel, Message as MessageModel
+from src.llm.schemas import MessagePage
+from .schemas import ExportFormat, MessageFilters
+
+EXPORT_COLUMNS = ["message_id", "conversation_id", "user_id", "created_at", "input", "response", "rating", "comment"]
+# Rows fetched from the server-side cursor at a time
+EXPORT_BATCH_SIZE = 500
+
+
+def apply_filters(query: Select, filters: MessageFilters, feedback_joined: bool = False) -> Select:
+    """Add the WHERE clauses for `filters` to a query over messages"""
+    if filters.user_id is not None:
+        query = query.where(MessageModel.user_id == filters.user_id)
+    if filters.start is not None:
+        query = query.where(MessageModel.created_at >= filters.start)
+    if filters.end is not None:
+        query = query.where(MessageModel.created_at < filters.end)
+    if filters.min_rating is not None or filters.max_rating is not None:
+        if not feedback_joined:
+            query = query.join(FeedbackModel, FeedbackModel.message_id == MessageModel.message_id)
+        if filters.min_rating is not None:
+            query = query.where(FeedbackModel.rating >= filters.min_rating)
+        if filters.max_rating is not None:
+            query = query.where(FeedbackModel.rating <= filters.max_rating)
+    return query
+
+
+async def get_messages(
+    db: AsyncSession,
+    filters: MessageFilters,
+    limit: int = 100,
+    before_message_id: Optional[int] = None,
+) -> MessagePage:
+    """Get a page of all messages (newest first) matching the filters"""
+    query = apply_filters(select(MessageModel), filters)
+    messages, next_cursor = await paginate(db, query, MessageModel.message_id, limit, before_message_id)
+    return MessagePage(messages=messages, next_cursor=next_cursor)
+
+
+def format_row(row: dict, export_format: ExportFormat) -> str:
+    if export_format == "ndjson":
+        return json.dumps(row, default=str) + "\n"
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row[column] for column in EXPORT_COLUMNS)
+    return buffer.getvalue()
+
+
+async def export_messages(
+    session_factory: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+    filters: MessageFilters,
+    export_format: ExportFormat,
+) -> AsyncIterator[str]:
+    """
+    Stream every message matching the filters (oldest first) as NDJSON or CSV.
+    Rows come from a server-side cursor in batches, so memory use does not grow with the table.
+    The session is opened here rather than taken from the request, it has to live as long as the stream.
+    """
+    query = select(
+        MessageModel.message_id,
+        MessageModel.conversation_id,
+        MessageModel.user_id,
+        MessageModel.created_at,
+        MessageModel.input,
+        MessageModel.response,
+        FeedbackModel.rating,
+        FeedbackModel.comment,
+    ).outerjoin(FeedbackModel, FeedbackModel.message_id == MessageModel.message_id)
+    query = apply_filters(query, filters, feedback_joined=True).order_by(MessageModel.message_id)
+
+    if export_format == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\r\n"
+
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.mappings().partitions():
+            yield "".join(format_row(dict(row), export_format) for row in partition)
@@ -0,0 +1,85 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from .schemas import UserOut
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class UserCache:
+    """
+    Short-lived cache of authenticated users, so requests with a valid token skip the `users` lookup.
+
+    Two tiers, both keyed by username and checked against the token version:
+    - in-process LRU (`local_ttl`, kept short since other instances can't invalidate it)
+    - Redis (`redis_ttl`), shared by every API instance and deleted by `invalidate`
+    Redis errors are logged and treated as a miss, auth then falls back to the database.
+    """
+
+    def __init__(self, local_ttl: float = 10, redis_ttl: int = 300, max_size: int = 10_000):
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.max_size = max_size
+        # username -> (token version, user, expiry)
+        self._local: OrderedDict[str, tuple[int, UserOut, float]] = OrderedDict()
+
+    @staticmethod
+    def redis_key(username: str) -> str:
+        return f"USERCACHE:{username}"
+
+    def _set_local(self, username: str, version: int, user: UserOut):
+        self._local[username] = (version, user, time.monotonic() + self.local_ttl)
+        self._local.move_to_end(username)
+        if len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    async def get(self, redis: Optional[Redis], username: str, version: int) -> Optional[UserOut]:
+        entry = self._local.get(username)
+        if entry is not None:
+            cached_version, user, expires_at = entry
+            if cached_version == version and time.monotonic() < expires_at:
+                self._local.move_to_end(username)
+                return user
+            del self._local[username]
+
+        if redis is None:
+            return None
+        try:
+            cached = await redis.get(self.redis_key(username))
+        except Exception as e:
+            logger.warning(f"User cache: Redis read failed: {e!r}")
+            return None
+        if cached is None:
+            return None
+
+        data = json.loads(cached)
+        if data["version"] != version:
+            return None
+        user = UserOut.model_validate(data["user"])
+        self._set_local(username, version, user)
+        return user
+
+    async def set(self, redis: Optional[Redis], user: UserOut, version: int):
+        self._set_local(user.username, version, user)
+        if redis is None:
+            return
+        try:
+            payload = json.dumps({"version": version, "user": user.model_dump()})
+            await redis.set(self.redis_key(user.username), payload, ex=self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"User cache: Redis write failed: {e!r}")
+
+    async def invalidate(self, redis: Optional[Redis], username: str):
+        """Drop a user after their row changed (ONC token, admin flag, ...)"""
+        self._local.pop(username, None)
+        if redis is None:
+            return
+        try:
+            await redis.delete(self.redis_key(username))
+        except Exception as e:
+            logger.warning(f"User cache: Redis invalidation failed: {e!r}")
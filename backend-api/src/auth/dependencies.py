@@ -1,43 +1,84 @@
-from typing import Annotated, Optional
+from typing import Annotated, Callable, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Dependencies (outside of auth module)
-from src.database import get_db_session
+from src.database import get_db_session, get_session_factory
 from src.settings import Settings, get_settings
 
-from . import service, models
+from . import service
+from .cache import UserCache
+from .schemas import TokenUser, UserOut
+from .throttle import LoginThrottle
 
 # Helpers from FastAPI security to extract OAuth2 token from HTTP request
 oauth2_scheme_required = OAuth2PasswordBearer(tokenUrl="/auth/login")
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
+def get_user_cache(request: Request) -> Optional[UserCache]:
+    """Dependency that returns the app's user cache"""
+    return getattr(request.app.state, "user_cache", None)
+
+
+def get_login_throttle(request: Request) -> Optional[LoginThrottle]:
+    """Dependency that returns the app's failed login tracker"""
+    return getattr(request.app.state, "login_throttle", None)
+
+
+async def get_user_from_token(request: Request, token: str, settings: Settings, session_factory) -> TokenUser:
+    """Access token claims only (signature check, no I/O). Older tokens without the claims use the user cache / DB"""
+    token_user = service.get_token_user(service.decode_token(token, settings, "access"))
+    if token_user is not None:
+        return token_user
+
+    # Session opened only for this fallback, so the common path never touches the pool
+    async with session_factory() as db:
+        user = await service.get_user_by_token(
+            token, settings, db, get_user_cache(request), getattr(request.app.state, "redis_client", None)
+        )
+    return TokenUser(id=user.id, username=user.username, is_admin=user.is_admin)
+
+
 async def get_current_user(
+    request: Request,
     token: Annotated[str, Depends(oauth2_scheme_required)],
     settings: Annotated[Settings, Depends(get_settings)],
-    db: Annotated[AsyncSession, Depends(get_db_session)],
-) -> models.User:
-    """Retrieves and validates a user by token"""
-    return await service.get_user_by_token(token, settings, db)
+    session_factory: Annotated[Callable, Depends(get_session_factory)],
+) -> TokenUser:
+    """Validates the access token and returns the identity it carries"""
+    return await get_user_from_token(request, token, settings, session_factory)
 
 
 async def get_optional_user(
+    request: Request,
     token: Annotated[Optional[str], Depends(oauth2_scheme_optional)],
     settings: Annotated[Settings, Depends(get_settings)],
-    db: Annotated[AsyncSession, Depends(get_db_session)],
-) -> Optional[models.User]:
+    session_factory: Annotated[Callable, Depends(get_session_factory)],
+) -> Optional[TokenUser]:
     """Dependency to get the current user if they are authenticated"""
     if token is None:
         return None
-    return await service.get_user_by_token(token, settings, db)
+    return await get_user_from_token(request, token, settings, session_factory)
+
+
+async def get_current_user_profile(
+    request: Request,
+    token: Annotated[str, Depends(oauth2_scheme_required)],
+    settings: Annotated[Settings, Depends(get_settings)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    cache: Annotated[Optional[UserCache], Depends(get_user_cache)],
+) -> UserOut:
+    """Full user record (incl. ONC token), from the user cache or the DB"""
+    redis = getattr(request.app.state, "redis_client", None)
+    return await service.get_user_by_token(token, settings, db, cache, redis)
 
 
 async def get_admin_user(
-    current_user: Annotated[models.User, Depends(get_current_user)],
-) -> models.User:
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
+) -> TokenUser:
     """Dependency to ensure the current user is an admin."""
     if not current_user.is_admin:
         raise HTTPException(
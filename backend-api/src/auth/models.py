@@ -19,6 +19,8 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String)
     onc_token: Mapped[str] = mapped_column(String)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Embedded in access tokens, bump it to invalidate every token issued before (e.g. after an admin change)
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # one-to-many: a user can have many conversations
     # Ensures deleting a user also deletes all their conversations
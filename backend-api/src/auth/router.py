@@ -1,16 +1,18 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Dependencies
-from src.database import get_db_session
-from .dependencies import get_current_user, get_settings
+from src.database import get_db_session, get_redis
+from .cache import UserCache
+from .dependencies import get_current_user_profile, get_login_throttle, get_settings, get_user_cache
+from .throttle import LoginThrottle
 from src.settings import Settings
 
-from .models import User
-from .schemas import Token, CreateUserRequest, UserOut
+from .schemas import Token, CreateUserRequest, RefreshRequest, UserOut
 from . import service
 
 router = APIRouter()
@@ -18,26 +20,55 @@ router = APIRouter()
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     settings: Annotated[Settings, Depends(get_settings)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
+    throttle: Annotated[Optional[LoginThrottle], Depends(get_login_throttle)],
 ) -> Token:
     """Authenticate user trying to login"""
-    return await service.login_user(form_data, settings, db)
+    redis = getattr(request.app.state, "redis_client", None)
+    client_ip = request.client.host if request.client else None
+    return await service.login_user(form_data, settings, db, throttle, redis, client_ip)
 
 
 @router.post("/register", status_code=201, response_model=Token)
 async def register_user(
+    request: Request,
     user_request: CreateUserRequest,
     settings: Annotated[Settings, Depends(get_settings)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
+    throttle: Annotated[Optional[LoginThrottle], Depends(get_login_throttle)],
 ) -> Token:
     """Register a new user"""
-    return await service.register_user(user_request, settings, db)
+    redis = getattr(request.app.state, "redis_client", None)
+    client_ip = request.client.host if request.client else None
+    return await service.register_user(user_request, settings, db, throttle, redis, client_ip)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    refresh_request: RefreshRequest,
+    settings: Annotated[Settings, Depends(get_settings)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+) -> Token:
+    """Exchange a refresh token for new access and refresh tokens (the old refresh token stops working)"""
+    return await service.refresh_tokens(refresh_request.refresh_token, settings, db, redis)
+
+
+@router.post("/logout", status_code=204)
+async def logout(
+    refresh_request: RefreshRequest,
+    settings: Annotated[Settings, Depends(get_settings)],
+    redis: Annotated[Redis, Depends(get_redis)],
+):
+    """Revoke the refresh token (access tokens run out on their own)"""
+    await service.revoke_refresh_token(refresh_request.refresh_token, settings, redis)
 
 
 @router.get("/me")
-async def get_me(user: Annotated[User, Depends(get_current_user)]) -> UserOut:
+async def get_me(user: Annotated[UserOut, Depends(get_current_user_profile)]) -> UserOut:
     """Get the current user"""
     # Uses get_current_user() dependency to grab user
     return user
@@ -45,9 +76,12 @@ async def get_me(user: Annotated[User, Depends(get_current_user)]) -> UserOut:
 
 @router.put("/me/onc-token", response_model=UserOut)
 async def update_onc_token(
-    user: Annotated[User, Depends(get_current_user)],
+    request: Request,
+    user: Annotated[UserOut, Depends(get_current_user_profile)],
     onc_token: str,
     db: Annotated[AsyncSession, Depends(get_db_session)],
+    cache: Annotated[Optional[UserCache], Depends(get_user_cache)],
 ) -> UserOut:
     """Update the ONC token for the current user"""
-    return await service.update_onc_token(user, onc_token, db)
+    redis = getattr(request.app.state, "redis_client", None)
+    return await service.update_onc_token(user, onc_token, db, cache, redis)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, ConfigDict
 
 class UserOut(BaseModel):
@@ -11,6 +13,13 @@ class UserOut(BaseModel):
     is_admin: bool = False
 
 
+class TokenUser(BaseModel):
+    """Identity carried in an access token (no database lookup needed)"""
+    id: int
+    username: str
+    is_admin: bool = False
+
+
 class CreateUserRequest(BaseModel):
     """Payload for Registration"""
     username: str
@@ -22,3 +31,9 @@ class Token(BaseModel):
     """JWT Token Response"""
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    """Payload for exchanging / revoking a refresh token"""
+    refresh_token: str
@@ -1,40 +1,96 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 
 import jwt # JSON Web Token for creating and decoding tokens
 from passlib.context import CryptContext # For password hashing and verification
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from jwt.exceptions import InvalidTokenError
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 
-from src.settings import Settings
+from src.settings import Settings, get_settings
 
+from src.auth.cache import UserCache
+from src.auth.throttle import LoginThrottle
 from src.auth.models import User as UserModel
-from src.auth.schemas import CreateUserRequest, Token
+from src.auth.schemas import CreateUserRequest, Token, TokenUser, UserOut
 
-# Create a password context using bycrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache
+def get_pwd_context() -> CryptContext:
+    """Password context using bcrypt with the configured work factor"""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=get_settings().BCRYPT_ROUNDS)
+
+@lru_cache
+def get_hash_executor() -> ThreadPoolExecutor:
+    """Threads for bcrypt (it releases the GIL), so hashing never blocks the event loop"""
+    return ThreadPoolExecutor(max_workers=get_settings().PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password using bcrypt"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+async def hash_password(password: str) -> str:
+    """get_password_hash on the hashing thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(get_hash_executor(), get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the hashing thread pool.
+    Also returns a new hash if the stored one uses outdated settings (e.g. a different BCRYPT_ROUNDS), else None
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        get_hash_executor(), get_pwd_context().verify_and_update, plain_password, hashed_password
+    )
+
+_dummy_hash: Optional[str] = None
+
+async def equalize_timing(password: str):
+    """Spend the bcrypt work of a real verification, so unknown usernames don't answer faster"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await hash_password("not a real password")
+    await verify_and_update_password(password, _dummy_hash)
+
+async def check_login_throttle(
+    throttle: Optional[LoginThrottle], redis: Optional[Redis], username: Optional[str], client_ip: Optional[str]
+):
+    """Refuse locked out usernames / IPs before any hashing is done"""
+    if throttle is None:
+        return
+    retry_after = await throttle.retry_after(redis, username, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many failed attempts. Retry after {retry_after}",
+            headers={"Retry-After": str(retry_after)},
+        )
 
 def create_access_token(
     username: str,
     expires_delta: timedelta,
     settings: Settings,
+    user_id: Optional[int] = None,
+    is_admin: bool = False,
+    token_version: int = 0,
 ) -> str:
     """Create a JWT access token for the given username with an expiry time."""
     expire = datetime.now(timezone.utc) + expires_delta
 
     # Token payload (data stored in the token)
-    to_encode = {"sub": username, "exp": expire}
+    # uid/adm carry what authorization needs, ver must match User.token_version for the token to be valid
+    to_encode = {"sub": username, "exp": expire, "typ": "access", "adm": is_admin, "ver": token_version}
+    if user_id is not None:
+        to_encode["uid"] = user_id
 
     # Create and sign the JWT token with secret key and algorithm
     encoded_jwt = jwt.encode(
@@ -43,47 +99,119 @@ def create_access_token(
     return encoded_jwt
 
 
-async def get_user(username: str, db: AsyncSession) -> Optional[UserModel]:
-    """Look up a user by their username in the DB"""
-    user = select(UserModel).where(UserModel.username == username)
-    result = await db.execute(user)
-    return result.scalar_one_or_none() # Fetch only single result
+def create_refresh_token(user: UserModel, settings: Settings, family: Optional[str] = None) -> str:
+    """
+    Create a single-use refresh token. Every token from the same login shares a `fam` (family) id,
+    so reuse of an already rotated token can revoke the whole chain.
+    """
+    expire = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode = {
+        "sub": user.username,
+        "uid": user.id,
+        "exp": expire,
+        "typ": "refresh",
+        "ver": user.token_version,
+        "jti": uuid.uuid4().hex,
+        "fam": family or uuid.uuid4().hex,
+    }
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-async def get_user_by_token(
-    token: str, settings: Settings, db: AsyncSession
-) -> UserModel:
-    """Validates token (of user) before looking up user"""
-    credentials_exception = HTTPException(
+
+def issue_tokens(user: UserModel, settings: Settings, family: Optional[str] = None) -> Token:
+    """Short-lived access token + refresh token for the user"""
+    access_token = create_access_token(
+        user.username,
+        timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        settings,
+        user_id=user.id,
+        is_admin=user.is_admin,
+        token_version=user.token_version,
+    )
+    refresh_token = create_refresh_token(user, settings, family)
+    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    # Validate token of user
+
+def decode_token(token: str, settings: Settings, token_type: str) -> dict:
+    """Check signature, expiry and type of a token (tokens issued before `typ` existed count as access tokens)"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except InvalidTokenError:
-        raise credentials_exception
-    
+        raise credentials_exception()
+    if payload.get("sub") is None or payload.get("typ", "access") != token_type:
+        raise credentials_exception()
+    return payload
+
+
+def get_token_user(payload: dict) -> Optional[TokenUser]:
+    """Identity from the claims of an access token, None for older tokens without them"""
+    if payload.get("uid") is None:
+        return None
+    return TokenUser(id=payload["uid"], username=payload["sub"], is_admin=bool(payload.get("adm", False)))
+
+
+async def get_user(username: str, db: AsyncSession) -> Optional[UserModel]:
+    """Look up a user by their username in the DB"""
+    user = select(UserModel).where(UserModel.username == username)
+    result = await db.execute(user)
+    return result.scalar_one_or_none() # Fetch only single result
+
+async def get_user_by_token(
+    token: str,
+    settings: Settings,
+    db: AsyncSession,
+    cache: Optional[UserCache] = None,
+    redis: Optional[Redis] = None,
+) -> UserOut:
+    """Validates token (of user) before looking up user (in the cache if given, else the DB)"""
+    # Validate token of user
+    payload = decode_token(token, settings, "access")
+    username = payload["sub"]
+    try:
+        token_version = int(payload.get("ver", 0))
+    except (TypeError, ValueError):
+        raise credentials_exception()
+
+    if cache is not None:
+        cached_user = await cache.get(redis, username, token_version)
+        if cached_user is not None:
+            return cached_user
+
     # Look up user
     user = await get_user(username, db)
-    if user is None:
-        raise credentials_exception
-    
-    return user
+    if user is None or user.token_version != token_version:
+        raise credentials_exception()
+
+    user_out = UserOut.model_validate(user)
+    if cache is not None:
+        await cache.set(redis, user_out, token_version)
+    return user_out
 
 
 async def register_user(
-    user_register: CreateUserRequest, settings: Settings, db: AsyncSession
+    user_register: CreateUserRequest,
+    settings: Settings,
+    db: AsyncSession,
+    throttle: Optional[LoginThrottle] = None,
+    redis: Optional[Redis] = None,
+    client_ip: Optional[str] = None,
 ) -> Token:
     """Register a new user and return a JWT token"""
+    await check_login_throttle(throttle, redis, None, client_ip)
 
     # Check if the username is already taken
     existing_user = await get_user(user_register.username, db)
     if existing_user:
+        # Probing for usernames counts against the IP
+        if throttle is not None:
+            await throttle.record_failure(redis, None, client_ip)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists",
@@ -93,7 +221,7 @@ async def register_user(
     new_user = UserModel(
         username=user_register.username,
         onc_token=user_register.onc_token,
-        hashed_password=get_password_hash(user_register.password),
+        hashed_password=await hash_password(user_register.password),
     )
 
     # Add new user to DB
@@ -101,22 +229,31 @@ async def register_user(
     await db.commit()
     await db.refresh(new_user)
 
-    # Generate and return a JWT token for the new user
-    token = create_access_token(
-        new_user.username, timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS), settings
-    )
-    return Token(access_token=token, token_type="bearer")
+    # Generate and return JWT tokens for the new user
+    return issue_tokens(new_user, settings)
 
 
 async def login_user(
-    form_data: OAuth2PasswordRequestForm, settings: Settings, db: AsyncSession
+    form_data: OAuth2PasswordRequestForm,
+    settings: Settings,
+    db: AsyncSession,
+    throttle: Optional[LoginThrottle] = None,
+    redis: Optional[Redis] = None,
+    client_ip: Optional[str] = None,
 ) -> Token:
     """Authenticate user credentials and return a JWT token"""
+    await check_login_throttle(throttle, redis, form_data.username, client_ip)
+
     # Check if user exists and that password is correct
     matched_user = await get_user(form_data.username, db)
-    if not matched_user or not verify_password(
-        form_data.password, matched_user.hashed_password
-    ):
+    verified, new_hash = False, None
+    if matched_user:
+        verified, new_hash = await verify_and_update_password(form_data.password, matched_user.hashed_password)
+    else:
+        await equalize_timing(form_data.password)
+    if not verified:
+        if throttle is not None:
+            await throttle.record_failure(redis, form_data.username, client_ip)
         # invalid credentials exception
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -124,22 +261,103 @@ async def login_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Generate and return a new token
-    token = create_access_token(
-        matched_user.username,
-        timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS),
-        settings,
-    )
-    return Token(access_token=token, token_type="bearer")
+    if throttle is not None:
+        await throttle.record_success(redis, matched_user.username)
 
+    # Transparently move the stored hash to the current work factor
+    if new_hash is not None:
+        matched_user.hashed_password = new_hash
+        await db.commit()
 
-async def update_onc_token(user: UserModel, new_onc_token: str, db: AsyncSession) -> UserModel:
-    """Update the ONC token for the given user"""
+    # Generate and return new tokens
+    return issue_tokens(matched_user, settings)
+
+
+def _revoked_key(jti: str) -> str:
+    return f"REVOKED:refresh:{jti}"
+
+
+def _revoked_family_key(family: str) -> str:
+    return f"REVOKED:family:{family}"
+
+
+def _seconds_left(payload: dict) -> int:
+    return max(int(payload["exp"] - datetime.now(timezone.utc).timestamp()), 1)
 
-    user.onc_token = new_onc_token
+
+async def refresh_tokens(refresh_token: str, settings: Settings, db: AsyncSession, redis: Redis) -> Token:
+    """
+    Exchange a refresh token for a new access + refresh token (rotation).
+    The revocation list in Redis is only consulted here, never for access tokens.
+    Presenting an already used refresh token revokes its whole family (likely stolen).
+    """
+    payload = decode_token(refresh_token, settings, "refresh")
+    jti, family = payload.get("jti"), payload.get("fam")
+    if not jti or not family:
+        raise credentials_exception()
+
+    if await redis.exists(_revoked_family_key(family)):
+        raise credentials_exception()
+    # Atomically mark this token used, only the first caller gets new tokens
+    if not await redis.set(_revoked_key(jti), 1, nx=True, ex=_seconds_left(payload)):
+        await redis.set(_revoked_family_key(family), 1, ex=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60)
+        raise credentials_exception()
+
+    # Role changes / revocations bump token_version, which ends the family here
+    user = await get_user(payload["sub"], db)
+    if user is None or user.token_version != payload.get("ver", 0):
+        raise credentials_exception()
+
+    return issue_tokens(user, settings, family)
+
+
+async def revoke_refresh_token(refresh_token: str, settings: Settings, redis: Redis):
+    """Log out: the refresh token and every token rotated from it stop working"""
+    payload = decode_token(refresh_token, settings, "refresh")
+    if payload.get("fam"):
+        await redis.set(_revoked_family_key(payload["fam"]), 1, ex=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60)
+
+
+async def update_onc_token(
+    user: UserOut,
+    new_onc_token: str,
+    db: AsyncSession,
+    cache: Optional[UserCache] = None,
+    redis: Optional[Redis] = None,
+) -> UserOut:
+    """Update the ONC token for the given user"""
 
     # Update DB
+    await db.execute(update(UserModel).where(UserModel.id == user.id).values(onc_token=new_onc_token))
     await db.commit()
-    await db.refresh(user)
 
-    return user
+    # Cached copies still hold the old token
+    if cache is not None:
+        await cache.invalidate(redis, user.username)
+
+    return user.model_copy(update={"onc_token": new_onc_token})
+
+
+async def set_admin(
+    user_id: int,
+    is_admin: bool,
+    db: AsyncSession,
+    cache: Optional[UserCache] = None,
+    redis: Optional[Redis] = None,
+) -> UserOut:
+    """
+    Grant or revoke admin rights. Bumps the token version: refresh tokens carrying the old role are refused,
+    so the change applies to the user's requests once their current access token expires.
+    """
+    user = await db.get(UserModel, user_id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    user.is_admin = is_admin
+    user.token_version += 1
+    await db.commit()
+
+    if cache is not None:
+        await cache.invalidate(redis, user.username)
+
+    return UserOut.model_validate(user)
@@ -0,0 +1,91 @@
+import logging
+from typing import List, Optional
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class LoginThrottle:
+    """
+    Failed login tracking in Redis, per username and per client IP.
+
+    After `max_failures` failures within `window` seconds the username (or `max_ip_failures` for the IP)
+    is locked out for `base_lockout` seconds, doubling with every further failure up to `max_lockout`.
+    Locked requests are refused before any bcrypt work is done.
+    Redis errors are logged and let the request through (the per-route rate limit still applies).
+    """
+
+    def __init__(
+        self,
+        max_failures: int = 5,
+        max_ip_failures: int = 20,
+        window: int = 15 * 60,
+        base_lockout: int = 30,
+        max_lockout: int = 60 * 60,
+    ):
+        self.max_failures = max_failures
+        self.max_ip_failures = max_ip_failures
+        self.window = window
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+
+    @staticmethod
+    def _subjects(username: Optional[str], ip: Optional[str]) -> List[str]:
+        subjects = []
+        if username:
+            subjects.append(f"user:{username.lower()}")
+        if ip:
+            subjects.append(f"ip:{ip}")
+        return subjects
+
+    def lockout_seconds(self, failures: int, threshold: int) -> int:
+        """0 below the threshold, then base_lockout doubling per extra failure"""
+        if failures < threshold:
+            return 0
+        return min(self.base_lockout * 2 ** (failures - threshold), self.max_lockout)
+
+    async def retry_after(self, redis: Optional[Redis], username: Optional[str], ip: Optional[str]) -> int:
+        """Seconds until the username / IP may try again (0 = not locked)"""
+        if redis is None:
+            return 0
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for subject in self._subjects(username, ip):
+                    pipe.ttl(f"LOGINLOCK:{subject}")
+                ttls = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Login throttle: Redis read failed: {e!r}")
+            return 0
+        return max([ttl for ttl in ttls if ttl > 0], default=0)
+
+    async def record_failure(self, redis: Optional[Redis], username: Optional[str], ip: Optional[str]):
+        if redis is None:
+            return
+        subjects = self._subjects(username, ip)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                for subject in subjects:
+                    pipe.incr(f"LOGINFAIL:{subject}")
+                    pipe.expire(f"LOGINFAIL:{subject}", self.window)
+                results = await pipe.execute()
+
+            failures = results[::2]
+            async with redis.pipeline(transaction=True) as pipe:
+                for subject, count in zip(subjects, failures):
+                    threshold = self.max_ip_failures if subject.startswith("ip:") else self.max_failures
+                    lockout = self.lockout_seconds(int(count), threshold)
+                    if lockout:
+                        pipe.set(f"LOGINLOCK:{subject}", 1, ex=lockout)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Login throttle: Redis write failed: {e!r}")
+
+    async def record_success(self, redis: Optional[Redis], username: str):
+        """A successful login clears the username's failures (the IP's are left to expire)"""
+        if redis is None:
+            return
+        try:
+            await redis.delete(f"LOGINFAIL:user:{username.lower()}", f"LOGINLOCK:user:{username.lower()}")
+        except Exception as e:
+            logger.warning(f"Login throttle: Redis write failed: {e!r}")
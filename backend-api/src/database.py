@@ -1,13 +1,14 @@
 import contextlib
 import logging
-from typing import Any, AsyncIterator
+from typing import Any, AsyncIterator, List, Optional, Tuple
 from uuid import uuid4
 
-from fastapi import Request
+from fastapi import HTTPException, Request, status
 from redis.asyncio import Redis
+from sqlalchemy import Select
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.pool import AsyncAdaptedQueuePool
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, InstrumentedAttribute
 
 from .settings import get_settings
 
@@ -28,13 +29,43 @@ class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    key: InstrumentedAttribute,
+    limit: int,
+    before: Optional[int] = None,
+) -> Tuple[List[Any], Optional[int]]:
+    """
+    Keyset pagination, newest first: one page of `query` with `key` below `before` (if given).
+    Returns (page, next_cursor), next_cursor being the value to pass as `before` for the following page.
+    """
+    if before is not None:
+        query = query.where(key < before)
+    # Fetch one extra row to know whether there is a next page
+    query = query.order_by(key.desc()).limit(limit + 1)
+
+    result = await db.execute(query)
+    # A query over a single model gives model instances, anything else gives rows
+    rows = list(result.scalars().all() if len(query.column_descriptions) == 1 else result.all())
+    next_cursor = getattr(rows[limit - 1], key.key) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
 class DatabaseSessionManager:
     """
     Manages the async SQLAlchemy engine and session lifecycle.
     Supports both Postgres (e.g., Supabase) and SQLite for testing.
     """
 
-    def __init__(self, db_url: str, engine_kwargs: dict[str, Any] = {}):
+    def __init__(
+        self,
+        db_url: str,
+        engine_kwargs: dict[str, Any] = {},
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+    ):
         self._url = db_url
         self._engine = None
         self._sessionmaker = None
@@ -65,8 +96,9 @@ class DatabaseSessionManager:
         self._engine = create_async_engine(
             db_url,
             poolclass=AsyncAdaptedQueuePool,
-            pool_size=5,
-            max_overflow=10,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,  # seconds to wait for a free connection before failing
             connect_args=connect_args,
             **engine_kwargs,
         )
@@ -120,6 +152,24 @@ async def get_db_session(request: Request) -> AsyncIterator[AsyncSession]:
         yield session
 
 
+# FastAPI dependency for Endpoints
+def get_session_factory(request: Request):
+    """
+    Dependency that returns the session factory itself, for work that outlives the dependency
+    (streaming responses) and has to open and close its own session.
+    """
+    return request.app.state.session_manager.session
+
+
+# FastAPI dependency for Endpoints
+async def get_redis(request: Request) -> Redis:
+    """Dependency that returns the shared Redis client"""
+    redis = getattr(request.app.state, "redis_client", None)
+    if redis is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Redis connection not initialized")
+    return redis
+
+
 # Creates an async Redis Client
 async def init_redis():
     redis = await Redis(
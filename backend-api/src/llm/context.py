@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from contextlib import AbstractAsyncContextManager
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .dependencies import LLMClient
+from .models import Conversation, Message
+from .utils import MessageContext, Role, get_context, to_chat_history
+
+logger = logging.getLogger("uvicorn.error")
+
+# Messages folded into the summary per LLM call, oldest first (longer backlogs are caught up over the next turns)
+MAX_MESSAGES_PER_SUMMARY = 20
+# Running summary updates (the event loop only keeps weak references to tasks)
+summary_tasks: Set[asyncio.Task] = set()
+
+
+async def build_context(
+    conversation_id: int,
+    db: AsyncSession,
+    max_words: int,
+    recent_messages: int,
+    before_message_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    Context for the next LLM call: the conversation's rolling summary (if any) followed by
+    the most recent messages not yet in it (at most `recent_messages`, within `max_words`), oldest first.
+    Costs two small indexed queries however long the conversation is.
+    """
+    result = await db.execute(
+        select(Conversation.summary, Conversation.summary_until_message_id).where(
+            Conversation.conversation_id == conversation_id
+        )
+    )
+    row = result.one_or_none()
+    summary, summary_until = (row.summary, row.summary_until_message_id) if row else (None, None)
+
+    # The summary's words count against the budget of the recent messages
+    summary_words = len(summary.split()) if summary else 0
+    context = await get_context(
+        conversation_id,
+        max_words - summary_words,
+        db,
+        max_messages=recent_messages,
+        chronological=True,
+        before_message_id=before_message_id,
+        after_message_id=summary_until,
+    )
+    if summary:
+        summary_message = MessageContext(role=Role.system, content=f"Summary of the earlier conversation: {summary}")
+        context.insert(0, summary_message.model_dump(mode="json"))
+    return context
+
+
+async def update_summary(
+    conversation_id: int,
+    llm: LLMClient,
+    session_factory: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+    recent_messages: int,
+):
+    """
+    Fold messages that dropped out of the recent window into the conversation summary.
+    Run after a turn completes (off the request path). The LLM call happens between two short
+    sessions, and the write only applies if no other update moved the summary in the meantime.
+    """
+    try:
+        async with session_factory() as db:
+            result = await db.execute(
+                select(Conversation.summary, Conversation.summary_until_message_id).where(
+                    Conversation.conversation_id == conversation_id
+                )
+            )
+            row = result.one_or_none()
+            if row is None:
+                return
+            summary, summary_until = row.summary, row.summary_until_message_id
+
+            unsummarized = [Message.conversation_id == conversation_id, Message.response != ""]
+            if summary_until is not None:
+                unsummarized.append(Message.message_id > summary_until)
+            query = select(Message.message_id, Message.input, Message.response).where(*unsummarized)
+            if recent_messages:
+                # Oldest message of the recent window, it and everything after it stay out of the summary
+                window_start = await db.scalar(
+                    select(Message.message_id)
+                    .where(*unsummarized)
+                    .order_by(Message.message_id.desc())
+                    .offset(recent_messages - 1)
+                    .limit(1)
+                )
+                if window_start is None:
+                    return
+                query = query.where(Message.message_id < window_start)
+            # Oldest first: the summary only ever moves past messages it has folded
+            query = query.order_by(Message.message_id).limit(MAX_MESSAGES_PER_SUMMARY)
+            to_fold = (await db.execute(query)).all()
+
+        if not to_fold:
+            return
+
+        new_summary = await llm.summarize(previous_summary=summary, chatHistory=to_chat_history(to_fold))
+
+        async with session_factory() as db:
+            until_unchanged = (
+                Conversation.summary_until_message_id.is_(None)
+                if summary_until is None
+                else Conversation.summary_until_message_id == summary_until
+            )
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.conversation_id == conversation_id, until_unchanged)
+                .values(summary=new_summary, summary_until_message_id=to_fold[-1].message_id)
+            )
+            await db.commit()
+    except Exception:
+        # The next turn retries, the context just carries fewer old messages until then
+        logger.exception(f"Updating the summary of conversation {conversation_id} failed")
+
+
+def schedule_summary_update(
+    conversation_id: int,
+    llm: LLMClient,
+    session_factory: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+    recent_messages: int,
+) -> asyncio.Task:
+    """
+    Run update_summary as a task of its own. Unlike a BackgroundTask it is not part of the request,
+    so the route timeout can't cancel it halfway through the summary LLM call.
+    """
+    task = asyncio.create_task(update_summary(conversation_id, llm, session_factory, recent_messages))
+    summary_tasks.add(task)
+    task.add_done_callback(summary_tasks.discard)
+    return task
@@ -1 +1,49 @@
-# router dependencies
\ No newline at end of file
+# router dependencies
+import sys
+from pathlib import Path
+from typing import Protocol
+
+from fastapi import HTTPException, Request, status
+
+from src.settings import get_settings
+
+# The LLM package lives at the repository root (NautiChat-Backend/LLM) and uses flat imports
+LLM_PACKAGE_DIR = Path(__file__).resolve().parents[3] / "LLM"
+
+
+class LLMClient(Protocol):
+    """What the endpoints need from LLM.LLM"""
+
+    async def run_conversation(self, user_prompt: str, startingPrompt: str = None, chatHistory: list[dict] = []) -> str:
+        ...
+
+    async def summarize(self, previous_summary: str = None, chatHistory: list[dict] = []) -> str:
+        ...
+
+
+def init_llm() -> LLMClient:
+    """Create the process-wide LLM instance (loads the embedding and reranker models, so this is slow)"""
+    if str(LLM_PACKAGE_DIR) not in sys.path:
+        sys.path.append(str(LLM_PACKAGE_DIR))
+
+    from Environment import Environment
+    from RAG import RAG
+    from LLM import LLM
+
+    env = Environment()
+    settings = get_settings()
+    return LLM(
+        env=env,
+        RAG_instance=RAG(env),
+        max_tool_rounds=settings.LLM_MAX_TOOL_ROUNDS,
+        timeout_seconds=settings.LLM_REQUEST_TIMEOUT,
+        max_request_tokens=settings.LLM_MAX_REQUEST_TOKENS,
+    )
+
+
+async def get_llm(request: Request) -> LLMClient:
+    """Dependency that returns the LLM created during app startup"""
+    llm = getattr(request.app.state, "llm", None)
+    if llm is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="LLM is not available")
+    return llm
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from contextlib import AbstractAsyncContextManager
+from typing import AsyncIterator, Callable, Optional
+from uuid import uuid4
+
+from redis.asyncio import Redis
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.settings import get_settings
+from .dependencies import LLMClient
+from .models import Message as MessageModel
+from .context import build_context, update_summary
+
+logger = logging.getLogger("uvicorn.error")
+
+# Redis list of pending generations (LPUSH to enqueue, workers BLMOVE them into their processing list)
+JOB_QUEUE_KEY = "llm:jobs"
+# Job state is kept for an hour, after that the stored Message is the source of truth
+JOB_STATUS_TTL = 60 * 60
+TERMINAL_STATUSES = ("done", "failed")
+# A worker refreshes its heartbeat while running, jobs in the processing list of a worker without one are re-queued
+WORKER_HEARTBEAT_TTL = 60
+# Claims per job (a job that keeps crashing its worker is failed instead of re-queued forever)
+MAX_JOB_ATTEMPTS = 3
+
+
+def job_status_key(message_id: int) -> str:
+    return f"llm:job:{message_id}"
+
+
+def job_channel(message_id: int) -> str:
+    return f"llm:job:{message_id}:events"
+
+
+def processing_key(worker_id: str) -> str:
+    return f"{JOB_QUEUE_KEY}:processing:{worker_id}"
+
+
+def heartbeat_key(worker_id: str) -> str:
+    return f"llm:worker:{worker_id}"
+
+
+async def set_job_status(
+    redis: Redis, message_id: int, status: str, response: Optional[str] = None, error: Optional[str] = None
+):
+    """Store the job state and notify subscribers (one round trip)"""
+    state = {"status": status}
+    if response is not None:
+        state["response"] = response
+    if error is not None:
+        state["error"] = error
+
+    key = job_status_key(message_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping=state)
+        pipe.expire(key, JOB_STATUS_TTL)
+        pipe.publish(job_channel(message_id), json.dumps(state))
+        await pipe.execute()
+
+
+async def get_job_status(redis: Redis, message_id: int) -> Optional[dict]:
+    state = await redis.hgetall(job_status_key(message_id))
+    return state or None
+
+
+async def enqueue_generation(redis: Redis, message_id: int):
+    """Queue the stored (response-less) message for a worker"""
+    await set_job_status(redis, message_id, "queued")
+    await redis.lpush(JOB_QUEUE_KEY, json.dumps({"message_id": message_id}))
+
+
+async def stream_job_events(redis: Redis, message_id: int, keepalive_sec: float = 15) -> AsyncIterator[str]:
+    """Server-sent events with the job state until it is done or failed"""
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(job_channel(message_id))
+    try:
+        # Subscribe first, then read the current state, so a finish in between can't be missed
+        state = await get_job_status(redis, message_id)
+        while True:
+            if state is not None:
+                yield f"data: {json.dumps(state)}\n\n"
+                if state.get("status") in TERMINAL_STATUSES:
+                    return
+            event = await pubsub.get_message(ignore_subscribe_messages=True, timeout=keepalive_sec)
+            if event is None:
+                state = None
+                yield ": keep-alive\n\n"
+            else:
+                state = json.loads(event["data"])
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+
+
+class GenerationWorker:
+    """
+    Takes message ids off the Redis queue, runs the LLM and writes Message.response.
+    Workers run inside the API process (LLM_WORKERS) or on their own with `python -m src.llm.jobs`.
+
+    A job is claimed by moving it into the worker's processing list and removed from there once handled,
+    so a crash or deploy mid-generation doesn't lose it: on startup, workers re-queue the processing lists
+    of workers whose heartbeat has expired (or of an earlier run with the same worker_id).
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        session_factory: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+        llm: LLMClient,
+        poll_timeout: int = 1,
+        worker_id: Optional[str] = None,
+    ):
+        self.redis = redis
+        self.session_factory = session_factory
+        self.llm = llm
+        self.poll_timeout = poll_timeout  # Must stay below the Redis socket timeout
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+        self.processing_key = processing_key(self.worker_id)
+        self.next_recovery = 0.0  # Event loop time of the next recover_stale_jobs, 0 = on the first job
+
+    async def process(self, message_id: int):
+        try:
+            attempts = await self.redis.hincrby(job_status_key(message_id), "attempts", 1)
+            if attempts > MAX_JOB_ATTEMPTS:
+                raise RuntimeError(f"Gave up after {MAX_JOB_ATTEMPTS} attempts")
+            await set_job_status(self.redis, message_id, "running")
+            # Short session to read the input and history, not held while the LLM runs
+            async with self.session_factory() as db:
+                message = await db.get(MessageModel, message_id)
+                if message is None:
+                    raise ValueError(f"Message {message_id} not found")
+                user_input, conversation_id = message.input, message.conversation_id
+                settings = get_settings()
+                chat_history = await build_context(
+                    conversation_id,
+                    db,
+                    settings.LLM_CONTEXT_MAX_WORDS,
+                    settings.LLM_CONTEXT_RECENT_MESSAGES,
+                    before_message_id=message_id,
+                )
+
+            response = await self.llm.run_conversation(user_prompt=user_input, chatHistory=chat_history)
+
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(MessageModel).where(MessageModel.message_id == message_id).values(response=response)
+                )
+                await db.commit()
+            await set_job_status(self.redis, message_id, "done", response=response)
+        except Exception as e:
+            logger.exception(f"Generation for message {message_id} failed")
+            try:
+                await set_job_status(self.redis, message_id, "failed", error=str(e))
+            except Exception:
+                logger.exception(f"Could not store the failure of message {message_id}")
+            return
+
+        # Fold older turns into the conversation summary (the client already has its response)
+        recent_messages = get_settings().LLM_CONTEXT_RECENT_MESSAGES
+        await update_summary(conversation_id, self.llm, self.session_factory, recent_messages)
+
+    async def heartbeat(self):
+        """Keep this worker's heartbeat alive (also while a long generation runs)"""
+        while True:
+            try:
+                await self.redis.set(heartbeat_key(self.worker_id), 1, ex=WORKER_HEARTBEAT_TTL)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Generation worker could not refresh its heartbeat")
+            await asyncio.sleep(WORKER_HEARTBEAT_TTL / 3)
+
+    async def recover_stale_jobs(self):
+        """
+        Move jobs claimed by workers without a heartbeat back to the queue. A stopped worker deletes its heartbeat,
+        one that crashed loses it after WORKER_HEARTBEAT_TTL; every worker runs this that often.
+        """
+        prefix = processing_key("")
+        async for key in self.redis.scan_iter(match=f"{prefix}*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            owner = key[len(prefix):]
+            if owner != self.worker_id and await self.redis.exists(heartbeat_key(owner)):
+                continue
+            # LMOVE is atomic, a crash here can't lose a job; RIGHT end = next one to be picked up
+            while (payload := await self.redis.lmove(key, JOB_QUEUE_KEY, "LEFT", "RIGHT")) is not None:
+                logger.warning(f"Re-queued job {payload} of stopped worker {owner}")
+
+    async def run_once(self) -> bool:
+        """
+        Claim and process one job (waits up to poll_timeout), recovering stale jobs first when that is due.
+        Errors are logged and False is returned, so one bad job or Redis hiccup can't stop the worker.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            if loop.time() >= self.next_recovery:
+                await self.recover_stale_jobs()
+                self.next_recovery = loop.time() + WORKER_HEARTBEAT_TTL
+            payload = await self.redis.blmove(JOB_QUEUE_KEY, self.processing_key, self.poll_timeout, "RIGHT", "LEFT")
+            if payload is not None:
+                await self.process(json.loads(payload)["message_id"])
+                await self.redis.lrem(self.processing_key, 1, payload)
+            return True
+        except asyncio.CancelledError:
+            # The claimed job stays in the processing list, another worker re-queues it once the heartbeat is gone
+            raise
+        except Exception:
+            logger.exception("Generation worker error, retrying")
+            await asyncio.sleep(1)
+            return False
+
+    async def run(self):
+        """Process jobs until cancelled"""
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            while True:
+                await self.run_once()
+        finally:
+            heartbeat.cancel()
+            # Other workers can pick up a job this one was cancelled on right away, not after the TTL
+            try:
+                await self.redis.delete(heartbeat_key(self.worker_id))
+            except Exception:
+                logger.exception("Generation worker could not delete its heartbeat")
+
+
+async def main():
+    """Run LLM_WORKERS generation workers in a process of their own"""
+    from src.database import DatabaseSessionManager, init_redis
+    from .dependencies import init_llm
+
+    settings = get_settings()
+    session_manager = DatabaseSessionManager(
+        settings.SUPABASE_DB_URL,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    redis = await init_redis()
+    llm = await asyncio.to_thread(init_llm)
+    workers = [GenerationWorker(redis, session_manager.session, llm) for _ in range(max(settings.LLM_WORKERS, 1))]
+    try:
+        await asyncio.gather(*(worker.run() for worker in workers))
+    finally:
+        await redis.aclose()
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
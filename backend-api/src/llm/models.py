@@ -1,6 +1,7 @@
-from typing import TYPE_CHECKING, List
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional
 
-from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database import Base
@@ -17,11 +18,14 @@ class Conversation(Base):
     conversation_id: Mapped[int] = mapped_column(primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String, nullable=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # Rolling summary of the messages up to (and including) summary_until_message_id, sent to the LLM instead of them
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    summary_until_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     # one-to-many: conversation can have many messages
     # Delete messages if conversation is deleted
-    # NOTE: lazy:selectin eager loads by default
-    messages: Mapped[List["Message"]] = relationship(back_populates="conversation", cascade="all, delete-orphan", lazy="selectin")
+    # NOTE: not eager loaded, queries that need the messages use selectinload(Conversation.messages)
+    messages: Mapped[List["Message"]] = relationship(back_populates="conversation", cascade="all, delete-orphan")
     # Many-to-one: links to user who 'owns' conversation
     user: Mapped["User"] = relationship(back_populates="conversations")
 
@@ -29,6 +33,8 @@ class Conversation(Base):
 class Message(Base):
     """Message Table in SQL DB"""
     __tablename__ = "messages"
+    # Newest messages of a conversation come straight off the index (pagination and LLM context)
+    __table_args__ = (Index("ix_messages_conversation_id_message_id", "conversation_id", "message_id"),)
 
     message_id: Mapped[int] = mapped_column(primary_key=True, index=True)
     conversation_id: Mapped[int] = mapped_column(ForeignKey("conversations.conversation_id"), nullable=False)
@@ -36,6 +42,7 @@ class Message(Base):
 
     input: Mapped[str] = mapped_column(Text)
     response: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     #many-to-one: each message belongs to a conversation
     conversation: Mapped["Conversation"] = relationship(back_populates="messages")
@@ -1,14 +1,23 @@
-from typing import List, Annotated
+from typing import Callable, List, Annotated, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Dependencies
 from src.auth.dependencies import get_current_user
-from src.database import get_db_session
-
-from src.auth.schemas import UserOut
-from .schemas import Conversation, Message, Feedback, CreateLLMQuery, CreateConversationBody
+from src.database import get_db_session, get_redis, get_session_factory
+from src.settings import get_settings
+from .context import schedule_summary_update
+from .dependencies import LLMClient, get_llm
+from .jobs import stream_job_events
+
+from src.auth.schemas import TokenUser
+from .schemas import (
+    Conversation, Message, Feedback, CreateLLMQuery, CreateConversationBody, GenerationJob, ConversationSummaryPage,
+    MessagePage,
+)
 from . import service
 
 
@@ -17,7 +26,7 @@ router = APIRouter()
 
 @router.post("/conversations", status_code=201, response_model=Conversation)
 async def create_conversation(
-    current_user: Annotated[UserOut, Depends(get_current_user)],
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
     create_conversation: CreateConversationBody,
 ) -> Conversation:
@@ -27,37 +36,103 @@ async def create_conversation(
 
 @router.get("/conversations", response_model=List[Conversation])
 async def get_conversations(
-    current_user: Annotated[UserOut, Depends(get_current_user)],
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> List[Conversation]:
     """Get a list of the users conversations in descending order"""
     return await service.get_conversations(current_user, db)
 
 
+# Declared before /conversations/{conversation_id} so "summaries" isn't parsed as an id
+@router.get("/conversations/summaries", response_model=ConversationSummaryPage)
+async def get_conversation_summaries(
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    before: Optional[int] = None,
+) -> ConversationSummaryPage:
+    """Get a page of the users conversations (ids, titles, message counts, last activity) in descending order"""
+    return await service.get_conversation_summaries(current_user, db, limit, before)
+
+
 @router.get("/conversations/{conversation_id}", response_model=Conversation)
 async def get_conversation(
     conversation_id: int,
-    current_user: Annotated[UserOut, Depends(get_current_user)],
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> Conversation:
     """Get a conversation"""
     return await service.get_conversation(conversation_id, current_user, db)
 
 
+@router.get("/conversations/{conversation_id}/messages", response_model=MessagePage)
+async def get_messages(
+    conversation_id: int,
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    before_message_id: Optional[int] = None,
+) -> MessagePage:
+    """Get a page of messages in a conversation in descending order"""
+    return await service.get_messages(conversation_id, current_user, db, limit, before_message_id)
+
+
 @router.post("/messages", status_code=201, response_model=Message)
 async def generate_response(
     llm_query: CreateLLMQuery,
-    current_user: Annotated[UserOut, Depends(get_current_user)],
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
+    llm: Annotated[LLMClient, Depends(get_llm)],
+    session_factory: Annotated[Callable, Depends(get_session_factory)],
 ) -> Message:
     """Send message to LLM which will generate a response"""
-    return await service.generate_response(llm_query, current_user, db)
+    message = await service.generate_response(llm_query, current_user, db, llm)
+    # Fold older turns into the conversation summary, outside the request so its timeout doesn't apply
+    schedule_summary_update(
+        llm_query.conversation_id, llm, session_factory, get_settings().LLM_CONTEXT_RECENT_MESSAGES
+    )
+    return message
+
+
+@router.post("/messages/jobs", status_code=202, response_model=GenerationJob)
+async def enqueue_response(
+    llm_query: CreateLLMQuery,
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+) -> GenerationJob:
+    """Queue the message for a background worker and return its id right away"""
+    return await service.enqueue_response(llm_query, current_user, db, redis)
+
+
+@router.get("/messages/{message_id}/status", response_model=GenerationJob)
+async def get_response_status(
+    message_id: int,
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+) -> GenerationJob:
+    """Poll the state of a queued message"""
+    return await service.get_response_status(message_id, current_user, db, redis)
+
+
+@router.get("/messages/{message_id}/events")
+async def stream_response_status(
+    message_id: int,
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+) -> StreamingResponse:
+    """Server-sent events with the state of a queued message until it is done or failed"""
+    # Access is checked up front, the stream itself only talks to Redis
+    await service.get_message(message_id, current_user, db)
+    return StreamingResponse(stream_job_events(redis, message_id), media_type="text/event-stream")
 
 
 @router.get("/messages/{message_id}", response_model=Message)
 async def get_message(
     message_id: int,
-    current_user: Annotated[UserOut, Depends(get_current_user)],
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> Message:
     """Get a message"""
@@ -68,7 +143,7 @@ async def get_message(
 async def submit_feedback(
     message_id: int,
     feedback: Feedback,
-    current_user: Annotated[UserOut, Depends(get_current_user)],
+    current_user: Annotated[TokenUser, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> Message:
     """Update the feedback in the Message model"""
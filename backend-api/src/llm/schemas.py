@@ -1,9 +1,12 @@
-from typing import Annotated, List, Optional
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional
 from pydantic import BaseModel, ConfigDict, Field
 
 
 class Feedback(BaseModel):
     """User Feedback on LLM Response"""
+    model_config = ConfigDict(from_attributes=True)
+
     rating: Annotated[int, Field(strict=True, ge=1, le=5)]
     comment: Optional[str] = None
 
@@ -18,6 +21,7 @@ class Message(BaseModel):
     user_id: int
     input: str
     response: str
+    created_at: Optional[datetime] = None
     feedback: Optional[Feedback] = None
 
 
@@ -31,6 +35,26 @@ class Conversation(BaseModel):
     messages: Optional[List[Message]] = []
 
 
+class ConversationSummary(BaseModel):
+    """Conversation without its messages (for listing)"""
+    conversation_id: int
+    title: Optional[str] = None
+    message_count: int
+    last_activity: Optional[datetime] = None  # time of the latest message, None if there are none
+
+
+class ConversationSummaryPage(BaseModel):
+    """Page of conversation summaries, newest first. Pass next_cursor as `before` to get the next page"""
+    conversations: List[ConversationSummary]
+    next_cursor: Optional[int] = None
+
+
+class MessagePage(BaseModel):
+    """Page of a conversation's messages, newest first. Pass next_cursor as `before_message_id` to get older ones"""
+    messages: List[Message]
+    next_cursor: Optional[int] = None
+
+
 class CreateConversationBody(BaseModel):
     """Payload for creating new conversation"""
     title: Optional[str] = None
@@ -39,4 +63,12 @@ class CreateConversationBody(BaseModel):
 class CreateLLMQuery(BaseModel):
     """Payload sent when querying LLM"""
     input: str
-    conversation_id: int
\ No newline at end of file
+    conversation_id: int
+
+
+class GenerationJob(BaseModel):
+    """State of a background LLM generation (the Message is created with an empty response)"""
+    message_id: int
+    status: Literal["queued", "running", "done", "failed"]
+    response: Optional[str] = None
+    error: Optional[str] = None
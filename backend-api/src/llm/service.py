@@ -1,16 +1,25 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import HTTPException
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.orm import selectinload
 
-from src.auth.schemas import UserOut
-from .schemas import Conversation, Message, Feedback, CreateLLMQuery, CreateConversationBody
+from src.auth.schemas import TokenUser
+from src.database import paginate
+from src.settings import get_settings
+from .dependencies import LLMClient
+from .jobs import enqueue_generation, get_job_status
+from .context import build_context
+from .schemas import (
+    Conversation, Message, Feedback, CreateLLMQuery, CreateConversationBody, GenerationJob,
+    ConversationSummary, ConversationSummaryPage, MessagePage,
+)
 from .models import Conversation as ConversationModel, Message as MessageModel, Feedback as FeedbackModel
 
 async def create_conversation(
-    current_user: UserOut,
+    current_user: TokenUser,
     db: AsyncSession,
     create_conversation: CreateConversationBody,
 ) -> Conversation:
@@ -31,7 +40,7 @@ async def create_conversation(
     )
 
 async def get_conversations(
-    current_user: UserOut,
+    current_user: TokenUser,
     db: AsyncSession,
 ) -> List[Conversation]:
     """Get all conversations (of the user)"""
@@ -40,9 +49,40 @@ async def get_conversations(
     result = await db.execute(query)
     return result.scalars().all()
 
+async def get_conversation_summaries(
+    current_user: TokenUser,
+    db: AsyncSession,
+    limit: int = 20,
+    before: Optional[int] = None,
+) -> ConversationSummaryPage:
+    """
+    Get a page of the user's conversations without loading their messages (newest first).
+    Keyset pagination: `before` is the conversation_id the previous page ended at.
+    """
+    # Correlated subqueries, so counts are only computed for the conversations on this page
+    message_count = (
+        select(func.count(MessageModel.message_id))
+        .where(MessageModel.conversation_id == ConversationModel.conversation_id)
+        .scalar_subquery()
+    )
+    last_activity = (
+        select(func.max(MessageModel.created_at))
+        .where(MessageModel.conversation_id == ConversationModel.conversation_id)
+        .scalar_subquery()
+    )
+    query = select(
+        ConversationModel.conversation_id,
+        ConversationModel.title,
+        message_count.label("message_count"),
+        last_activity.label("last_activity"),
+    ).where(ConversationModel.user_id == current_user.id)
+    rows, next_cursor = await paginate(db, query, ConversationModel.conversation_id, limit, before)
+    conversations = [ConversationSummary.model_validate(row, from_attributes=True) for row in rows]
+    return ConversationSummaryPage(conversations=conversations, next_cursor=next_cursor)
+
 async def get_conversation(
     conversation_id: int,
-    current_user: UserOut,
+    current_user: TokenUser,
     db: AsyncSession,
 ) -> Conversation:
     """Get a single conversation given a conv_id (of the user)"""
@@ -56,16 +96,10 @@ async def get_conversation(
 
     return conversation
 
-async def generate_response(
-    llm_query: CreateLLMQuery,
-    current_user: UserOut,
-    db: AsyncSession,
-) -> Message: 
-    """Validate user creating new Message that will be sent to LLM"""
-    #TODO: Integrate LLM
-
+async def validate_conversation_access(conversation_id: int, current_user: TokenUser, db: AsyncSession):
+    """Raise unless the conversation exists and belongs to the current user"""
     # Validate whether converstation exists or if current user has access to conversation
-    result = await db.execute(select(ConversationModel).where(ConversationModel.conversation_id == llm_query.conversation_id))
+    result = await db.execute(select(ConversationModel).where(ConversationModel.conversation_id == conversation_id))
     conversation = result.scalar_one_or_none()
 
     if not conversation: 
@@ -79,12 +113,47 @@ async def generate_response(
             detail="Not authorized to access this conversation"
         )
 
-    # Create Message to send to LLM  
+async def get_messages(
+    conversation_id: int,
+    current_user: TokenUser,
+    db: AsyncSession,
+    limit: int = 20,
+    before_message_id: Optional[int] = None,
+) -> MessagePage:
+    """Get a page of a conversation's messages (newest first), older than before_message_id if given"""
+    await validate_conversation_access(conversation_id, current_user, db)
+
+    query = select(MessageModel).where(MessageModel.conversation_id == conversation_id)
+    messages, next_cursor = await paginate(db, query, MessageModel.message_id, limit, before_message_id)
+    return MessagePage(messages=messages, next_cursor=next_cursor)
+
+async def generate_response(
+    llm_query: CreateLLMQuery,
+    current_user: TokenUser,
+    db: AsyncSession,
+    llm: LLMClient,
+) -> Message: 
+    """
+    Validate user creating new Message, send it to the LLM and store the response.
+    Runs as two short transactions so no pooled connection is held while the LLM generates.
+    """
+    await validate_conversation_access(llm_query.conversation_id, current_user, db)
+
+    # Summary of older turns + the most recent messages give the LLM context
+    settings = get_settings()
+    chat_history = await build_context(
+        llm_query.conversation_id, db, settings.LLM_CONTEXT_MAX_WORDS, settings.LLM_CONTEXT_RECENT_MESSAGES
+    )
+    # End the read transaction: the session gives its connection back to the pool until the write below
+    await db.commit()
+
+    response = await llm.run_conversation(user_prompt=llm_query.input, chatHistory=chat_history)
+
     message = MessageModel(
         conversation_id=llm_query.conversation_id, 
         user_id=current_user.id, 
         input=llm_query.input, 
-        response=f"LLM Response for: {llm_query.input}"
+        response=response
     )
 
     # Add message to DB
@@ -93,9 +162,47 @@ async def generate_response(
     await db.refresh(message)
     return message
 
+async def enqueue_response(
+    llm_query: CreateLLMQuery,
+    current_user: TokenUser,
+    db: AsyncSession,
+    redis: Redis,
+) -> GenerationJob:
+    """Store the Message without a response and queue the generation for a worker"""
+    await validate_conversation_access(llm_query.conversation_id, current_user, db)
+
+    message = MessageModel(
+        conversation_id=llm_query.conversation_id,
+        user_id=current_user.id,
+        input=llm_query.input,
+        response="",
+    )
+    db.add(message)
+    await db.commit()
+
+    await enqueue_generation(redis, message.message_id)
+    return GenerationJob(message_id=message.message_id, status="queued")
+
+async def get_response_status(
+    message_id: int,
+    current_user: TokenUser,
+    db: AsyncSession,
+    redis: Redis,
+) -> GenerationJob:
+    """Get the state of a queued generation"""
+    message = await get_message(message_id, current_user, db)
+
+    state = await get_job_status(redis, message_id)
+    if state is not None:
+        return GenerationJob(message_id=message_id, **state)
+    # Job state expired (or the message was generated synchronously): the stored response decides
+    if message.response:
+        return GenerationJob(message_id=message_id, status="done", response=message.response)
+    return GenerationJob(message_id=message_id, status="failed", error="Generation result not available")
+
 async def get_message(
     message_id: int,
-    current_user: UserOut,
+    current_user: TokenUser,
     db: AsyncSession,
 ) -> Message:
     """Get a single message given a message_id"""
@@ -114,7 +221,7 @@ async def get_message(
 async def submit_feedback(
     message_id: int,
     feedback: Feedback,
-    current_user: UserOut,
+    current_user: TokenUser,
     db: AsyncSession,
 ) -> Message:
     """Create Feedback entry for Message (or update current Feedback)"""
@@ -1,11 +1,11 @@
 from enum import Enum
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.llm.models import Conversation, Message
+from src.llm.models import Message
 
 
 # Pydantic models for better autocomplete within this file. Could be nice for AI LLM code to also use pydantic models
@@ -19,16 +19,41 @@ class MessageContext(BaseModel):
     content: str
 
 
-async def get_context(conversation_id: int, max_words: int, db: AsyncSession) -> List[dict]:
-    """Return a list of messages for the LLM to use as context"""
+def to_chat_history(messages) -> List[dict]:
+    """(input, response) rows -> chat messages, in the order given"""
+    context: List[MessageContext] = []
+    for message in messages:
+        context.append(MessageContext(role=Role.user, content=message.input))
+        context.append(MessageContext(role=Role.system, content=message.response))
+    return [model.model_dump(mode="json") for model in context]
 
-    conversation_result = await db.execute(select(Conversation).filter(Conversation.conversation_id == conversation_id))
-    conversation = conversation_result.scalar_one_or_none()
-    assert conversation, "Invalid conversation id"
 
-    # most recent messages first
-    messages: List[Message] = conversation.messages[::-1]
-    context: List[MessageContext] = []
+async def get_context(
+    conversation_id: int,
+    max_words: int,
+    db: AsyncSession,
+    max_messages: int = 50,
+    chronological: bool = False,
+    before_message_id: Optional[int] = None,
+    after_message_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    Return a list of messages for the LLM to use as context.
+    Most recent messages first, unless chronological=True (oldest first, the order a chat completion expects).
+    Only messages between after_message_id and before_message_id (both exclusive, if given) are considered.
+    """
+
+    # most recent messages first (ordered and limited in SQL using the (conversation_id, message_id) index)
+    # only the two text columns are loaded, not the ORM objects with their feedback
+    query = select(Message.input, Message.response).where(Message.conversation_id == conversation_id)
+    if before_message_id is not None:
+        query = query.where(Message.message_id < before_message_id)
+    if after_message_id is not None:
+        query = query.where(Message.message_id > after_message_id)
+    query = query.order_by(Message.message_id.desc()).limit(max_messages)
+    result = await db.execute(query)
+    messages = result.all()
+    selected = []
 
     context_words = 0
 
@@ -37,10 +62,12 @@ async def get_context(conversation_id: int, max_words: int, db: AsyncSession) ->
             4 + len(message.input.split()) + len(message.response.split())
         )  # extra words for "role", "content"
         if context_words + message_words < max_words:
-            context.append(MessageContext(role=Role.user, content=message.input))
-            context.append(MessageContext(role=Role.system, content=message.response))
+            selected.append(message)
             context_words += message_words
         else:
             break
 
-    return [model.model_dump(mode="json") for model in context]
+    if chronological:
+        selected.reverse()
+
+    return to_chat_history(selected)
@@ -12,7 +12,11 @@ from src.llm import models  # noqa
 
 from src.admin.router import router as admin_router
 from src.auth.router import router as auth_router
+from src.auth.cache import UserCache
+from src.auth.throttle import LoginThrottle
 from src.llm.router import router as llm_router
+from src.llm.dependencies import init_llm
+from src.llm.jobs import GenerationWorker
 from src.database import DatabaseSessionManager, init_redis
 from src.middleware import RateLimitMiddleware  # Custom middleware for rate limiting
 from src.settings import get_settings  # Settings management for environment variables
@@ -29,7 +33,13 @@ async def lifespan(app: FastAPI):
         async with asyncio.timeout(20):
             # Setup up database session manager
             logger.info("Initializing Session Manager...")
-            session_manager = DatabaseSessionManager(get_settings().SUPABASE_DB_URL)
+            settings = get_settings()
+            session_manager = DatabaseSessionManager(
+                settings.SUPABASE_DB_URL,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+            )
             app.state.session_manager = session_manager
             logger.info("Database session manager initialized")
         async with asyncio.timeout(20):
@@ -37,8 +47,29 @@ async def lifespan(app: FastAPI):
             logger.info("Initializing Redis client...")
             app.state.redis_client = await init_redis()
             logger.info("Redis client initialized")
+
+        # One LLM/RAG instance shared by every request (model loading is too slow to do per request)
+        app.state.llm = None
+        if get_settings().LLM_ENABLED:
+            try:
+                logger.info("Initializing LLM...")
+                app.state.llm = await asyncio.to_thread(init_llm)
+                logger.info("LLM initialized")
+            except Exception:
+                # Keep serving the other endpoints, /llm/messages answers 503 until restarted
+                logger.exception("Failed to initialize LLM")
+
+        # Workers for POST /llm/messages/jobs (more can run elsewhere with `python -m src.llm.jobs`)
+        app.state.llm_workers = []
+        if app.state.llm is not None:
+            for _ in range(get_settings().LLM_WORKERS):
+                worker = GenerationWorker(app.state.redis_client, session_manager.session, app.state.llm)
+                app.state.llm_workers.append(asyncio.create_task(worker.run()))
         yield
     finally:
+        for task in getattr(app.state, "llm_workers", []):
+            task.cancel()
+        await asyncio.gather(*getattr(app.state, "llm_workers", []), return_exceptions=True)
         # Close connection to database and Redis Connection
         if hasattr(app.state, "redis_client"):
             logger.info("Closing Redis client...")
@@ -50,6 +81,10 @@ async def lifespan(app: FastAPI):
 
 def create_app():
     app = FastAPI(lifespan=lifespan)
+    # Authenticated users, so most requests skip the users table lookup
+    app.state.user_cache = UserCache()
+    # Failed login tracking (lockouts are checked before any bcrypt work)
+    app.state.login_throttle = LoginThrottle()
 
     origins = ["http://localhost:3000", "https://nautichat.vercel.app"]
 
@@ -1,50 +1,131 @@
 import asyncio
-from typing import Optional
+from typing import Iterable, Optional
 
-from fastapi import Request, status
+import jwt
+from fastapi import status
 from fastapi.responses import JSONResponse
+from jwt.exceptions import InvalidTokenError
 from redis.asyncio import Redis  # Async Redis Client
-from starlette.middleware.base import BaseHTTPMiddleware  # Base class for custom middleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from src.rate_limit import (
+    DEFAULT_EXEMPT_PATHS,
+    DEFAULT_POLICIES,
+    DEFAULT_ROUTE_RULES,
+    DEFAULT_ROUTE_TIMEOUTS,
+    RateLimitPolicy,
+    RouteRule,
+    RouteTimeout,
+    TwoTierRateLimiter,
+    match_rule,
+)
+from src.settings import get_settings
 
-# TODO: There should be try/except for catching Redis Errors (If Redis is unavailable)
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, window_sec: int = 30, max_requests: int = 10):
-        super().__init__(app)
-        self.window_sec = window_sec  # Time window in seconds
-        self.max_requests = max_requests  # Max allowed requests in time window
 
-    async def permit_request(self, redis: Redis, key: str):
-        # If the ip does not exist in the cache, add it with the value of max_requests
-        # and set the expiration time to window_sec
-        await redis.set(key, self.max_requests, ex=self.window_sec, nx=True)
-        cache_val: Optional[bytes] = await redis.get(key)
+class RateLimitMiddleware:
+    """
+    Token-bucket rate limiting with a policy per route.
+    Requests are keyed by the authenticated username when a valid JWT is present, otherwise by client IP.
+    If Redis is slow or down the limiter falls back to per-instance limits (see TwoTierRateLimiter).
 
-        # Fetch current number of requests remaining
-        if cache_val is not None:
-            requests_remaining = int(cache_val)
-            if requests_remaining > 0:
-                await redis.decr(key)
-                return True
+    Implemented as plain ASGI middleware (no BaseHTTPMiddleware task/stream wrapping), so streaming
+    responses and contextvars pass through untouched. Each request gets a time limit from `timeouts`
+    (first match) or `default_timeout`; None disables the limit for long-lived streams.
+    """
 
-        return False  # Rate limit got exceeded
+    def __init__(
+        self,
+        app: ASGIApp,
+        policies: Iterable[RateLimitPolicy] = DEFAULT_POLICIES,
+        rules: Iterable[RouteRule] = DEFAULT_ROUTE_RULES,
+        exempt_paths: Iterable[str] = DEFAULT_EXEMPT_PATHS,
+        limiter: Optional[TwoTierRateLimiter] = None,
+        timeouts: Iterable[RouteTimeout] = DEFAULT_ROUTE_TIMEOUTS,
+        default_timeout: Optional[float] = 10,
+    ):
+        self.app = app
+        self.policies = {policy.name: policy for policy in policies}
+        self.rules = list(rules)
+        self.exempt_paths = frozenset(exempt_paths)
+        self.limiter = limiter if limiter else TwoTierRateLimiter()
+        self.timeouts = list(timeouts)
+        self.default_timeout = default_timeout
 
-    async def dispatch(self, request: Request, call_next):
-        if not request.client:
+    def client_key(self, scope: Scope) -> str:
+        """Identify the caller: username from a valid bearer token, else the client IP"""
+        authorization = Headers(scope=scope).get("Authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            settings = get_settings()
+            try:
+                # Signature check only (no DB lookup), an invalid token falls back to the IP
+                username: Optional[str] = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get(
+                    "sub"
+                )
+                if username:
+                    return f"user:{username}"
+            except InvalidTokenError:
+                pass
+
+        if not scope.get("client"):
             raise ValueError("Client IP not found")
+        return f"ip:{scope['client'][0]}"
+
+    def timeout_for(self, method: str, path: str) -> Optional[float]:
+        route_timeout = match_rule(self.timeouts, method, path)
+        return route_timeout.seconds if route_timeout else self.default_timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        if path in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        rule = match_rule(self.rules, method, path)
+        policy = self.policies[rule.policy if rule else "default"]
+        cost = rule.cost if rule else 1
 
-        # Track per-user requests
-        client_ip = request.client.host
-        redis: Redis = request.app.state.redis_client
-        key = f"{client_ip}:RATELIMIT"
+        redis: Optional[Redis] = getattr(scope["app"].state, "redis_client", None)
+        result = await self.limiter.hit(redis, self.client_key(scope), policy, cost)
+        headers = {
+            "X-RateLimit-Limit": str(policy.capacity),
+            "X-RateLimit-Remaining": str(result.remaining),
+            "X-RateLimit-Reset": str(result.reset),
+            "X-RateLimit-Policy": policy.name,
+        }
 
         # If Rate limit got exceeded
-        if not await self.permit_request(redis, key):
-            time_to_wait = await redis.ttl(key)
-            retry_info = f" Retry after {int(time_to_wait)}" if time_to_wait is not None else ""
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS, content={"detail": f"Rate limit exceeded.{retry_info}"}
+        if not result.allowed:
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": f"Rate limit exceeded. Retry after {result.retry_after}"},
+                headers={**headers, "Retry-After": str(result.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_with_headers(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        try:
+            async with asyncio.timeout(self.timeout_for(method, path)):
+                await self.app(scope, receive, send_with_headers)
+        except TimeoutError:
+            # Once headers are out the client can only see the stream end, so only answer if nothing was sent
+            if response_started:
+                raise
+            response = JSONResponse(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": "Request timed out"}, headers=headers
             )
-        async with asyncio.timeout(10):  # Optional timeout for the request processing
-            response = await call_next(request)
-        return response
+            await response(scope, receive, send)
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Literal, Optional, Sequence, Union
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Token bucket: holds up to `capacity` tokens and refills at `refill_per_sec` tokens per second"""
+
+    name: str
+    capacity: int
+    refill_per_sec: float
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    """
+    Charges requests matching `method` + `path` to a policy.
+    `path` is an exact path or a glob where '*' matches any characters, e.g. "/llm/messages/*/events"
+    """
+
+    method: str
+    path: str
+    policy: str
+    cost: int = 1
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.method != "*" and self.method != method:
+            return False
+        if "*" in self.path:
+            return fnmatchcase(path, self.path)
+        return path == self.path
+
+
+@dataclass(frozen=True)
+class RouteTimeout:
+    """Time limit (seconds, None = unlimited) for requests matching `method` + `path` (same matching as RouteRule)"""
+
+    method: str
+    path: str
+    seconds: Optional[float]
+
+    matches = RouteRule.matches
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    reset: int  # seconds until the bucket is full again
+    retry_after: int  # seconds until the request would be allowed (0 if allowed)
+    granted: int = 0  # tokens taken from the shared bucket (cost + any extra leased to this instance)
+
+
+DEFAULT_POLICIES = [
+    # Cheap reads: bursts of 20, ~40 requests / minute sustained
+    RateLimitPolicy("default", capacity=20, refill_per_sec=2 / 3),
+    # LLM generations (RAG + Groq calls): 5 in a burst, 5 / minute sustained
+    RateLimitPolicy("llm", capacity=5, refill_per_sec=5 / 60),
+    # Login / registration (bcrypt work): 5 in a burst, 5 / minute sustained
+    RateLimitPolicy("auth", capacity=5, refill_per_sec=5 / 60),
+]
+
+# First matching rule wins, unmatched requests use the "default" policy with cost 1
+DEFAULT_ROUTE_RULES = [
+    RouteRule("POST", "/llm/messages", policy="llm"),
+    RouteRule("POST", "/llm/messages/jobs", policy="llm"),
+    RouteRule("POST", "/auth/login", policy="auth"),
+    RouteRule("POST", "/auth/register", policy="auth"),
+]
+
+DEFAULT_EXEMPT_PATHS = frozenset({"/health"})
+
+# Requests not matched here get the middleware's default timeout (10 seconds).
+# Long-lived / streaming routes should be listed with seconds=None.
+DEFAULT_ROUTE_TIMEOUTS = [
+    # RAG retrieval + up to two LLM completions
+    RouteTimeout("POST", "/llm/messages", 60),
+    # Server-sent events for a background generation, open until the job finishes
+    RouteTimeout("GET", "/llm/messages/*/events", None),
+    # Admin export streams the whole messages table
+    RouteTimeout("GET", "/admin/messages/export", None),
+]
+
+# Token bucket evaluated atomically on the Redis server (one round trip per request).
+# Uses the Redis clock so every API instance agrees on the refill time.
+# KEYS[1] = bucket key, ARGV = capacity, refill per second, cost, tokens requested (>= cost)
+# If at least `cost` tokens are available, up to `requested` tokens are granted so the caller can
+# serve the following requests locally.
+# Returns {allowed (1/0), tokens granted, tokens remaining, seconds until full, seconds until allowed}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local granted = 0
+local retry_after = 0
+if tokens >= cost then
+    granted = math.max(cost, math.min(requested, math.floor(tokens)))
+    tokens = tokens - granted
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, granted, math.floor(tokens), math.ceil((capacity - tokens) / rate), retry_after}
+"""
+
+
+class RedisTokenBucket:
+    """Token buckets stored in Redis, shared by every API instance"""
+
+    def __init__(self):
+        self._script = None  # Registered Lua script (sent as EVALSHA, falls back to EVAL on NOSCRIPT)
+
+    async def hit(
+        self, redis: Redis, key: str, policy: RateLimitPolicy, cost: int, requested: Optional[int] = None
+    ) -> RateLimitResult:
+        if self._script is None or self._script.registered_client is not redis:
+            self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+        allowed, granted, remaining, reset, retry_after = await self._script(
+            keys=[f"RATELIMIT:{policy.name}:{key}"],
+            args=[policy.capacity, policy.refill_per_sec, cost, max(cost, requested or cost)],
+        )
+        return RateLimitResult(bool(int(allowed)), int(remaining), int(reset), int(retry_after), int(granted))
+
+
+class LocalTokenBucket:
+    """In-process token buckets (per API instance), used when Redis is unavailable"""
+
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[tuple[str, str], list[float]] = OrderedDict()  # (policy, key) -> [tokens, ts]
+
+    def hit(self, key: str, policy: RateLimitPolicy, cost: int) -> RateLimitResult:
+        now = time.monotonic()
+        bucket_key = (policy.name, key)
+        tokens, ts = self._buckets.pop(bucket_key, (policy.capacity, now))
+        tokens = min(policy.capacity, tokens + max(0.0, now - ts) * policy.refill_per_sec)
+
+        allowed = tokens >= cost
+        retry_after = 0
+        if allowed:
+            tokens -= cost
+        else:
+            retry_after = int(-(-(cost - tokens) // policy.refill_per_sec))
+
+        # Most recently used keys at the end, evict from the front
+        self._buckets[bucket_key] = [tokens, now]
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        reset = int(-(-(policy.capacity - tokens) // policy.refill_per_sec))
+        return RateLimitResult(allowed, int(tokens), reset, retry_after, cost if allowed else 0)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and stays open for `reset_timeout` seconds.
+    After that a single trial call is let through (half-open): success closes it, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> Literal["closed", "open", "half-open"]:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Rate limiter: Redis unhealthy, falling back to local limits")
+            self.opened_at = time.monotonic()
+
+
+class TwoTierRateLimiter:
+    """
+    Redis token buckets with an in-process tier in front of them.
+
+    - Leasing: a request that reaches Redis may take up to `lease_fraction` of the bucket capacity at once.
+      The extra tokens are kept locally for `lease_ttl` seconds and spent without a Redis round trip, so
+      Redis sees roughly one call per lease instead of one per request. Policies with a small capacity
+      (lease of 1) stay exact.
+    - Circuit breaker: Redis calls are bounded by `redis_timeout`. After repeated errors/timeouts Redis is
+      skipped and requests are decided by `fallback`: "local" enforces the same policies per instance,
+      "allow" lets every request through (fail open).
+    """
+
+    def __init__(
+        self,
+        lease_fraction: float = 0.2,
+        lease_ttl: float = 2.0,
+        redis_timeout: float = 0.25,
+        fallback: Literal["local", "allow"] = "local",
+        breaker: Optional[CircuitBreaker] = None,
+        max_keys: int = 10_000,
+    ):
+        self.lease_fraction = lease_fraction
+        self.lease_ttl = lease_ttl
+        self.redis_timeout = redis_timeout
+        self.fallback = fallback
+        self.breaker = breaker if breaker else CircuitBreaker()
+        self.max_keys = max_keys
+        self.redis_bucket = RedisTokenBucket()
+        self.local_bucket = LocalTokenBucket(max_keys)
+        # (policy, key) -> [leased tokens, lease expiry, last shared remaining, last reset]
+        self._leases: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+
+    def _lease_size(self, policy: RateLimitPolicy, cost: int) -> int:
+        return max(cost, int(policy.capacity * self.lease_fraction))
+
+    def _spend_lease(self, key: tuple[str, str], cost: int) -> Optional[RateLimitResult]:
+        lease = self._leases.get(key)
+        if lease is None:
+            return None
+        tokens, expires_at, shared_remaining, reset = lease
+        if time.monotonic() >= expires_at:
+            # Unused leased tokens are dropped, which errs on the strict side
+            del self._leases[key]
+            return None
+        if tokens < cost:
+            return None
+        lease[0] = tokens - cost
+        return RateLimitResult(True, int(shared_remaining + lease[0]), int(reset), 0)
+
+    def _store_lease(self, key: tuple[str, str], result: RateLimitResult, cost: int):
+        extra = result.granted - cost
+        if extra <= 0:
+            self._leases.pop(key, None)
+            return
+        self._leases[key] = [extra, time.monotonic() + self.lease_ttl, result.remaining, result.reset]
+        self._leases.move_to_end(key)
+        if len(self._leases) > self.max_keys:
+            self._leases.popitem(last=False)
+
+    def _fallback(self, key: str, policy: RateLimitPolicy, cost: int) -> RateLimitResult:
+        if self.fallback == "allow":
+            return RateLimitResult(True, policy.capacity, 0, 0)
+        return self.local_bucket.hit(key, policy, cost)
+
+    async def hit(self, redis: Optional[Redis], key: str, policy: RateLimitPolicy, cost: int) -> RateLimitResult:
+        lease_key = (policy.name, key)
+        leased = self._spend_lease(lease_key, cost)
+        if leased is not None:
+            return leased
+
+        if redis is None or not self.breaker.allow_request():
+            return self._fallback(key, policy, cost)
+
+        try:
+            async with asyncio.timeout(self.redis_timeout):
+                result = await self.redis_bucket.hit(redis, key, policy, cost, self._lease_size(policy, cost))
+        except Exception as e:  # Redis errors and timeouts
+            logger.debug(f"Rate limiter Redis call failed: {e!r}")
+            self.breaker.record_failure()
+            return self._fallback(key, policy, cost)
+
+        self.breaker.record_success()
+        if result.allowed:
+            self._store_lease(lease_key, result, cost)
+            # Report what is left including the tokens this instance now holds
+            result = RateLimitResult(True, result.remaining + result.granted - cost, result.reset, 0, result.granted)
+        return result
+
+
+def match_rule(rules: Sequence[Union[RouteRule, RouteTimeout]], method: str, path: str):
+    """Return the first rule matching the request, or None"""
+    for rule in rules:
+        if rule.matches(method, path):
+            return rule
+    return None
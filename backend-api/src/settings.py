@@ -1,5 +1,6 @@
 from functools import lru_cache 
 from pathlib import Path
+from typing import Optional
 
 # Used to validate .env variables
 from pydantic_settings import BaseSettings, SettingsConfigDict 
@@ -10,10 +11,38 @@ env_file_location = str(Path(__file__).resolve().parent.parent / ".env")
 class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
-    ACCESS_TOKEN_EXPIRE_HOURS: int
+    # Access tokens are short-lived and checked by signature only, refresh tokens renew them
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    # No longer used (see ACCESS_TOKEN_EXPIRE_MINUTES), kept so existing environments still load
+    ACCESS_TOKEN_EXPIRE_HOURS: Optional[int] = None
     REDIS_PASSWORD: str
     SUPABASE_DB_URL: str
 
+    # Connection pool per API process (Supabase limits the total number of connections)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+
+    # bcrypt work factor, existing hashes with a different cost are re-hashed on the next login
+    BCRYPT_ROUNDS: int = 12
+    # Threads that run bcrypt off the event loop (bounds concurrent hashing CPU per process)
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # Load the LLM + RAG models at startup (disable to run the API without them)
+    LLM_ENABLED: bool = True
+    # Word budget for the conversation history sent to the LLM
+    LLM_CONTEXT_MAX_WORDS: int = 1000
+    # Most recent messages sent verbatim, older ones are folded into the conversation summary
+    LLM_CONTEXT_RECENT_MESSAGES: int = 6
+    # Background generation workers started with the API (0 when they run as separate processes)
+    LLM_WORKERS: int = 1
+    # Agent loop bounds per LLM request: tool-call rounds, wall-clock seconds (below the 60s POST /llm/messages
+    # route timeout, so the answer is returned rather than cut off) and tokens across all completions
+    LLM_MAX_TOOL_ROUNDS: int = 3
+    LLM_REQUEST_TIMEOUT: float = 50
+    LLM_MAX_REQUEST_TOKENS: int = 30000
+
     model_config = SettingsConfigDict(env_file=env_file_location)
 
 # Caches the settings instance to avoid re-parsing .env file
@@ -4,8 +4,10 @@ import asyncio
 import pytest_asyncio
 
 from datetime import timedelta
+from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
+from fakeredis import FakeAsyncRedis
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -17,9 +19,11 @@ SUPABASE_DB_URL = os.environ["SUPABASE_DB_URL"]
 
 # Must be imported after setting SUPABASE_DB_URL
 from src.settings import get_settings
-from src.database import Base, get_db_session
+from src.database import Base, get_db_session, get_session_factory
 from src.auth import models
 from src.auth.service import create_access_token
+from src.llm.context import summary_tasks
+from src.llm.dependencies import get_llm
 from src.main import create_app
 
 
@@ -42,8 +46,27 @@ async def async_session() -> AsyncIterator[AsyncSession]:
     async with async_session_factory() as session:
         yield session
 
+class FakeLLM:
+    """Stands in for LLM.LLM so tests don't load models or call Groq"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def run_conversation(self, user_prompt, startingPrompt=None, chatHistory=[]):
+        self.calls.append({"user_prompt": user_prompt, "chatHistory": chatHistory})
+        return f"LLM Response for: {user_prompt}"
+
+    async def summarize(self, previous_summary=None, chatHistory=[]):
+        turns = [message["content"] for message in chatHistory if message["role"] == "user"]
+        return "; ".join(([previous_summary] if previous_summary else []) + turns)
+
+
+@pytest.fixture()
+def fake_llm() -> FakeLLM:
+    return FakeLLM()
+
 @pytest_asyncio.fixture()
-async def client(async_session: AsyncSession, request) -> AsyncIterator[AsyncClient]:
+async def client(async_session: AsyncSession, fake_llm: FakeLLM, request) -> AsyncIterator[AsyncClient]:
     """Return a test client which can be used to send api requests"""
 
     async def override_get_db_session():
@@ -51,15 +74,26 @@ async def client(async_session: AsyncSession, request) -> AsyncIterator[AsyncCli
 
     test_app = create_app()
 
+    # In-memory Redis (with Lua support) stands in for Redis Cloud
+    test_app.state.redis_client = FakeAsyncRedis(decode_responses=True)
+
     # Disable middleware unless @pytest.mark.use_middleware
     if request.node.get_closest_marker("use_middleware") is None:
         test_app.user_middleware = []
 
+    @asynccontextmanager
+    async def override_session():
+        yield async_session
+
     test_app.dependency_overrides[get_db_session] = override_get_db_session
+    test_app.dependency_overrides[get_session_factory] = lambda: override_session
+    test_app.dependency_overrides[get_llm] = lambda: fake_llm
 
     transport = ASGITransport(app=test_app)
     async with AsyncClient(transport=transport, base_url="http://test") as c:
         yield c
+    # Summary updates run as tasks of their own, don't let them outlive the test's session
+    await asyncio.gather(*summary_tasks, return_exceptions=True)
 
 @pytest_asyncio.fixture()
 async def user_headers(async_session: AsyncSession):
@@ -74,7 +108,13 @@ async def user_headers(async_session: AsyncSession):
     await async_session.refresh(test_user)
 
     settings = get_settings()
-    token = create_access_token(test_user.username, timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS), settings)
+    token = create_access_token(
+        test_user.username,
+        timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        settings,
+        user_id=test_user.id,
+        is_admin=test_user.is_admin,
+    )
 
     return {"Authorization": f"Bearer {token}"}
 
@@ -91,7 +131,13 @@ async def admin_headers(async_session: AsyncSession):
     await async_session.refresh(admin_user)
 
     settings = get_settings()
-    token = create_access_token(admin_user.username, timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS), settings)
+    token = create_access_token(
+        admin_user.username,
+        timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        settings,
+        user_id=admin_user.id,
+        is_admin=admin_user.is_admin,
+    )
 
     return {"Authorization": f"Bearer {token}"}
 
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from httpx import AsyncClient
 from fastapi import status
@@ -13,3 +15,36 @@ async def test_admin_endpoint_unauthenticated(client: AsyncClient):
 async def test_admin_endpoint_as_user(client: AsyncClient, user_headers):
     response = await client.get("/admin/messages", headers=user_headers)
     assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.asyncio
+async def test_admin_messages_filtered_and_exported(client: AsyncClient, user_headers, admin_headers):
+    response = await client.post("/llm/conversations", json={"title": "Export"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+    message_ids = []
+    for text in ["first", "second", "third"]:
+        response = await client.post("/llm/messages", json={"input": text, "conversation_id": conv_id}, headers=user_headers)
+        message_ids.append(response.json()["message_id"])
+    await client.patch(f"/llm/messages/{message_ids[1]}/feedback", json={"rating": 5}, headers=user_headers)
+
+    # Keyset pages, newest first
+    response = await client.get("/admin/messages", params={"limit": 2}, headers=admin_headers)
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    assert [m["input"] for m in page["messages"]] == ["third", "second"]
+    assert page["next_cursor"] == message_ids[1]
+
+    response = await client.get("/admin/messages", params={"min_rating": 4}, headers=admin_headers)
+    assert [m["input"] for m in response.json()["messages"]] == ["second"]
+
+    # NDJSON export, oldest first
+    response = await client.get("/admin/messages/export", headers=admin_headers)
+    assert response.status_code == status.HTTP_200_OK
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["input"] for row in rows] == ["first", "second", "third"]
+    assert rows[1]["rating"] == 5
+
+    response = await client.get("/admin/messages/export", params={"format": "csv", "min_rating": 5}, headers=admin_headers)
+    lines = response.text.splitlines()
+    assert lines[0].startswith("message_id,conversation_id")
+    assert len(lines) == 2
@@ -2,10 +2,12 @@ import pytest
 from httpx import AsyncClient
 from fastapi import status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from passlib.hash import bcrypt
+from sqlalchemy import select, update
 
 from src.auth import models, schemas
 from src.auth.service import get_password_hash
+from src.settings import get_settings
 
 
 @pytest.mark.asyncio
@@ -103,3 +105,113 @@ async def test_login_invalid_user(client: AsyncClient):
     )
 
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_current_user_cached(client: AsyncClient, async_session: AsyncSession, user_headers):
+    response = await client.get("/auth/me", headers=user_headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    # Served from the cache: the users table isn't read again
+    await async_session.execute(update(models.User).values(username="renamed"))
+    await async_session.commit()
+    response = await client.get("/auth/me", headers=user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == "testuser"
+
+
+@pytest.mark.asyncio
+async def test_update_onc_token_invalidates_cache(client: AsyncClient, user_headers):
+    await client.get("/auth/me", headers=user_headers)
+
+    response = await client.put("/auth/me/onc-token", params={"onc_token": "newtoken"}, headers=user_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["onc_token"] == "newtoken"
+
+    response = await client.get("/auth/me", headers=user_headers)
+    assert response.json()["onc_token"] == "newtoken"
+
+
+@pytest.mark.asyncio
+async def test_role_change_revokes_tokens(client: AsyncClient, user_headers, admin_headers):
+    response = await client.get("/auth/me", headers=user_headers)
+    user_id = response.json()["id"]
+
+    response = await client.patch(f"/admin/users/{user_id}", json={"is_admin": True}, headers=admin_headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["is_admin"]
+
+    # Token was issued for the old role
+    response = await client.get("/auth/me", headers=user_headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_cost(client: AsyncClient, async_session: AsyncSession):
+    # Stored with a lower work factor than BCRYPT_ROUNDS
+    password = "supersecure"
+    user = models.User(username="old hash", hashed_password=bcrypt.using(rounds=4).hash(password), onc_token="token")
+    async_session.add(user)
+    await async_session.commit()
+
+    response = await client.post("/auth/login", data={"username": user.username, "password": password})
+    assert response.status_code == status.HTTP_200_OK
+
+    await async_session.refresh(user)
+    assert bcrypt.from_string(user.hashed_password).rounds == get_settings().BCRYPT_ROUNDS
+    assert bcrypt.verify(password, user.hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_login_lockout_after_failures(client: AsyncClient, async_session: AsyncSession):
+    user = models.User(username="target", hashed_password=bcrypt.using(rounds=4).hash("right"), onc_token="token")
+    async_session.add(user)
+    await async_session.commit()
+
+    throttle = client._transport.app.state.login_throttle
+    for _ in range(throttle.max_failures):
+        response = await client.post("/auth/login", data={"username": "target", "password": "wrong"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # Locked out: even the right password is refused without being checked
+    response = await client.post("/auth/login", data={"username": "target", "password": "right"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert 0 < int(response.headers["Retry-After"]) <= throttle.base_lockout
+
+    # Other usernames from the same IP are not locked yet
+    response = await client.post("/auth/login", data={"username": "someoneelse", "password": "wrong"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_rotation(client: AsyncClient):
+    response = await client.post("/auth/register", json={"username": "rotating", "password": "pass", "onc_token": "t"})
+    tokens = response.json()
+    assert tokens["refresh_token"]
+
+    # Refresh tokens aren't access tokens
+    response = await client.get("/llm/conversations", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    response = await client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == status.HTTP_200_OK
+    rotated = response.json()
+    response = await client.get("/llm/conversations", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert response.status_code == status.HTTP_200_OK
+
+    # Reusing the old refresh token revokes the whole family, including the rotated one
+    response = await client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = await client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_refresh_token(client: AsyncClient):
+    response = await client.post("/auth/register", json={"username": "leaving", "password": "pass", "onc_token": "t"})
+    refresh_token = response.json()["refresh_token"]
+
+    response = await client.post("/auth/logout", json={"refresh_token": refresh_token})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = await client.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
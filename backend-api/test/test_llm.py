@@ -1,11 +1,20 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
 import pytest
 from httpx import AsyncClient
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth.models import User
+from src.llm.dependencies import get_llm
+from src.llm.context import MAX_MESSAGES_PER_SUMMARY, summary_tasks, update_summary
+from src.llm import jobs
+from src.llm.jobs import JOB_QUEUE_KEY, GenerationWorker, get_job_status, heartbeat_key, processing_key
 from src.llm.models import Conversation, Message
 from src.llm.utils import get_context
+from src.settings import get_settings
 
 
 @pytest.mark.asyncio
@@ -173,3 +182,242 @@ async def test_get_context(async_session: AsyncSession, user_headers):
     assert context_2[0]["content"] == message_15.input
     assert context_2[1]["role"] == "system"
     assert context_2[1]["content"] == message_15.response
+
+
+@pytest.mark.asyncio
+async def test_generate_response_sends_history(client: AsyncClient, user_headers, fake_llm):
+    response = await client.post("/llm/conversations", json={"title": "History"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+
+    for text in ["first question", "second question", "third question"]:
+        response = await client.post("/llm/messages", json={"input": text, "conversation_id": conv_id}, headers=user_headers)
+        assert response.status_code == 201
+
+    # Last call gets the two earlier turns, oldest first
+    history = fake_llm.calls[-1]["chatHistory"]
+    assert fake_llm.calls[-1]["user_prompt"] == "third question"
+    assert [message["content"] for message in history] == [
+        "first question",
+        "LLM Response for: first question",
+        "second question",
+        "LLM Response for: second question",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_generate_response_releases_connection(client: AsyncClient, user_headers, async_session: AsyncSession):
+    class CheckingLLM:
+        in_transaction = None
+
+        async def run_conversation(self, user_prompt, startingPrompt=None, chatHistory=[]):
+            # No transaction open means no pooled connection is held while generating
+            CheckingLLM.in_transaction = async_session.in_transaction()
+            return "Checked"
+
+    client._transport.app.dependency_overrides[get_llm] = lambda: CheckingLLM()
+    response = await client.post("/llm/conversations", json={"title": "Pool"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+
+    response = await client.post("/llm/messages", json={"input": "Hi", "conversation_id": conv_id}, headers=user_headers)
+    assert response.status_code == 201
+    assert response.json()["response"] == "Checked"
+    assert CheckingLLM.in_transaction is False
+
+
+@pytest.mark.asyncio
+async def test_generation_job(client: AsyncClient, user_headers, async_session: AsyncSession, fake_llm):
+    response = await client.post("/llm/conversations", json={"title": "Jobs"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+
+    response = await client.post("/llm/messages/jobs", json={"input": "Queued", "conversation_id": conv_id}, headers=user_headers)
+    assert response.status_code == 202
+    message_id = response.json()["message_id"]
+    assert response.json()["status"] == "queued"
+
+    # Nothing is generated in the request itself
+    assert fake_llm.calls == []
+    redis = client._transport.app.state.redis_client
+    assert await redis.llen(JOB_QUEUE_KEY) == 1
+
+    # Run the job the way a worker would
+    @asynccontextmanager
+    async def session_factory():
+        yield async_session
+
+    worker = GenerationWorker(redis, session_factory, fake_llm)
+    _, payload = await redis.brpop([JOB_QUEUE_KEY], timeout=1)
+    await worker.process(json.loads(payload)["message_id"])
+
+    response = await client.get(f"/llm/messages/{message_id}/status", headers=user_headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    assert response.json()["response"] == "LLM Response for: Queued"
+
+    # Finished jobs stream their final state and close
+    response = await client.get(f"/llm/messages/{message_id}/events", headers=user_headers)
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert '"status": "done"' in response.text
+
+    response = await client.get(f"/llm/messages/{message_id}", headers=user_headers)
+    assert response.json()["response"] == "LLM Response for: Queued"
+
+
+@pytest.mark.asyncio
+async def test_generation_worker_recovers_stale_jobs(client: AsyncClient, user_headers, async_session: AsyncSession, fake_llm):
+    response = await client.post("/llm/conversations", json={"title": "Jobs"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+    response = await client.post("/llm/messages/jobs", json={"input": "Lost", "conversation_id": conv_id}, headers=user_headers)
+    message_id = response.json()["message_id"]
+
+    # A worker claimed the job and died mid-generation (no heartbeat), and a job for a deleted message is queued
+    redis = client._transport.app.state.redis_client
+    await redis.lmove(JOB_QUEUE_KEY, processing_key("dead"), "RIGHT", "LEFT")
+    await redis.lpush(JOB_QUEUE_KEY, json.dumps({"message_id": 999999}))
+
+    @asynccontextmanager
+    async def session_factory():
+        yield async_session
+
+    worker = GenerationWorker(redis, session_factory, fake_llm, worker_id="new")
+    assert await worker.run_once()
+    assert await worker.run_once()
+
+    # Both jobs were handled, the missing message failed without raising
+    assert (await get_job_status(redis, message_id))["status"] == "done"
+    assert (await get_job_status(redis, 999999))["status"] == "failed"
+    assert await redis.llen(JOB_QUEUE_KEY) == 0
+    assert await redis.llen(processing_key("dead")) == 0
+    assert await redis.llen(processing_key("new")) == 0
+
+
+@pytest.mark.asyncio
+async def test_generation_worker_recovers_jobs_once_heartbeat_expires(
+    client: AsyncClient, user_headers, async_session: AsyncSession, fake_llm, monkeypatch
+):
+    monkeypatch.setattr(jobs, "WORKER_HEARTBEAT_TTL", 0.05)
+    response = await client.post("/llm/conversations", json={"title": "Jobs"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+    message_ids = []
+    for text in ["Claimed by old", "Queued"]:
+        response = await client.post("/llm/messages/jobs", json={"input": text, "conversation_id": conv_id}, headers=user_headers)
+        message_ids.append(response.json()["message_id"])
+
+    # A worker of the previous deploy claimed the first job, its heartbeat has not expired yet
+    redis = client._transport.app.state.redis_client
+    await redis.lmove(JOB_QUEUE_KEY, processing_key("old"), "RIGHT", "LEFT")
+    await redis.set(heartbeat_key("old"), 1, px=50)
+
+    @asynccontextmanager
+    async def session_factory():
+        yield async_session
+
+    worker = GenerationWorker(redis, session_factory, fake_llm, worker_id="new")
+    assert await worker.run_once()
+    assert (await get_job_status(redis, message_ids[0]))["status"] == "queued"
+    assert await redis.llen(processing_key("old")) == 1
+
+    # Once the heartbeat is gone, the next periodic recovery re-queues the job
+    await asyncio.sleep(0.1)
+    assert await worker.run_once()
+    assert (await get_job_status(redis, message_ids[0]))["status"] == "done"
+    assert (await get_job_status(redis, message_ids[1]))["status"] == "done"
+    assert await redis.llen(processing_key("old")) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_conversation_summaries(client: AsyncClient, user_headers):
+    conv_ids = []
+    for title in ["First", "Second", "Third"]:
+        response = await client.post("/llm/conversations", json={"title": title}, headers=user_headers)
+        conv_ids.append(response.json()["conversation_id"])
+    for text in ["one", "two"]:
+        await client.post("/llm/messages", json={"input": text, "conversation_id": conv_ids[0]}, headers=user_headers)
+
+    # Newest first, two per page
+    response = await client.get("/llm/conversations/summaries", params={"limit": 2}, headers=user_headers)
+    assert response.status_code == 200
+    page = response.json()
+    assert [c["title"] for c in page["conversations"]] == ["Third", "Second"]
+    assert page["conversations"][0]["message_count"] == 0
+    assert page["conversations"][0]["last_activity"] is None
+    assert page["next_cursor"] == conv_ids[1]
+
+    response = await client.get(
+        "/llm/conversations/summaries", params={"limit": 2, "before": page["next_cursor"]}, headers=user_headers
+    )
+    page = response.json()
+    assert [c["title"] for c in page["conversations"]] == ["First"]
+    assert page["conversations"][0]["message_count"] == 2
+    assert page["conversations"][0]["last_activity"] is not None
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_messages_paginated(client: AsyncClient, user_headers):
+    response = await client.post("/llm/conversations", json={"title": "Long"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+    for i in range(5):
+        await client.post("/llm/messages", json={"input": f"message {i}", "conversation_id": conv_id}, headers=user_headers)
+
+    url = f"/llm/conversations/{conv_id}/messages"
+    response = await client.get(url, params={"limit": 3}, headers=user_headers)
+    assert response.status_code == 200
+    page = response.json()
+    assert [m["input"] for m in page["messages"]] == ["message 4", "message 3", "message 2"]
+    assert page["next_cursor"] == page["messages"][-1]["message_id"]
+
+    response = await client.get(url, params={"limit": 3, "before_message_id": page["next_cursor"]}, headers=user_headers)
+    page = response.json()
+    assert [m["input"] for m in page["messages"]] == ["message 1", "message 0"]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_context_uses_rolling_summary(client: AsyncClient, user_headers, async_session: AsyncSession, fake_llm, monkeypatch):
+    monkeypatch.setattr(get_settings(), "LLM_CONTEXT_RECENT_MESSAGES", 2)
+    response = await client.post("/llm/conversations", json={"title": "Summary"}, headers=user_headers)
+    conv_id = response.json()["conversation_id"]
+
+    for i in range(5):
+        await client.post("/llm/messages", json={"input": f"question {i}", "conversation_id": conv_id}, headers=user_headers)
+        # Summary updates run as tasks of their own after the response
+        await asyncio.gather(*summary_tasks)
+
+    # Everything but the two most recent messages is folded into the summary
+    conversation = await async_session.get(Conversation, conv_id)
+    await async_session.refresh(conversation)
+    assert conversation.summary == "question 0; question 1; question 2"
+
+    await client.post("/llm/messages", json={"input": "question 5", "conversation_id": conv_id}, headers=user_headers)
+    history = fake_llm.calls[-1]["chatHistory"]
+    assert history[0]["content"] == "Summary of the earlier conversation: question 0; question 1; question 2"
+    assert [message["content"] for message in history[1:] if message["role"] == "user"] == ["question 3", "question 4"]
+
+
+@pytest.mark.asyncio
+async def test_summary_catches_up_on_long_backlog(async_session: AsyncSession, user_headers, fake_llm):
+    # A conversation with more unsummarized messages than one update folds
+    user = (await async_session.execute(select(User))).scalars().first()
+    conversation = Conversation(user_id=user.id)
+    async_session.add(conversation)
+    await async_session.commit()
+    count = MAX_MESSAGES_PER_SUMMARY + 5
+    async_session.add_all(
+        Message(conversation_id=conversation.conversation_id, user_id=user.id, input=f"question {i}", response="answer")
+        for i in range(count)
+    )
+    await async_session.commit()
+
+    @asynccontextmanager
+    async def session_factory():
+        yield async_session
+
+    # The oldest messages are folded first, the rest on the next update
+    await update_summary(conversation.conversation_id, fake_llm, session_factory, recent_messages=2)
+    await async_session.refresh(conversation)
+    assert conversation.summary == "; ".join(f"question {i}" for i in range(MAX_MESSAGES_PER_SUMMARY))
+
+    await update_summary(conversation.conversation_id, fake_llm, session_factory, recent_messages=2)
+    await async_session.refresh(conversation)
+    # Every message but the two most recent ones made it into the summary
+    assert conversation.summary == "; ".join(f"question {i}" for i in range(count - 2))